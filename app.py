@@ -1,15 +1,50 @@
+import os
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import folium
 from streamlit_folium import st_folium
 from folium import plugins
-from io import BytesIO
-import json
-from datetime import time, timedelta
+
+from radius_coverage import coverage_available
+from dataset_store import DatasetStore
+from delta_update import apply_delta, delta_key, read_delta, update_prepared
+from density_grid import DENSITY_SHAPES, NO_WEIGHT, density_layer, density_legend_html, density_weights
+from draw_filter import drawn_items_group, normalize_drawings, points_in_shapes, shapes_key
+from export_io import EXCEL_MAX_ROWS, EXPORT_FORMATS, export_bytes
+from filter_index import FilterIndex
+from instrumentation import PROFILE_ENV, PROFILE_LOG_ENV, StageProfiler, memory_report, process_peak_rss_mb
+from ingest_cache import (
+    compact_dtypes, content_hash, load_frame_cached, load_workbooks, spill_frame, workbook_dataset_key,
+    workbook_jobs, workbook_sheets,
+)
+from map_core import (
+    ALL_OPTION, FILTER_HIERARCHY, FOLIUM_COLOR_HEX, LEGEND_SORTS, NO_LEGEND, additional_filter_columns,
+    available_folium_colors, color_columns, export_frame, icon_colors, legend_html, map_center, map_frame, marker_layer,
+    normalize_display_values, radius_layers, resolve_marker_colors, restore_selection, sanitize_coordinates,
+)
+from map_render import PrerenderedLayer, prerender
+from nearest_neighbor import (
+    NEAREST_MARKER_COLOR, NEAREST_NONE, nearest_enrichment, nearest_popups, nearest_summary,
+)
+from progress_io import dump_progress_json, dump_progress_zip, load_progress, settings_hash
+from tile_pyramid import NO_TILES, list_pyramids, load_meta, meta_version, tile_layer, tile_url
+from viewport_cluster import ViewportClusterIndex
 
 st.set_page_config(page_title="Dynamic Map App", layout="wide")
 
+# === Instrumentasi (opsional): ?profile=1 / ?profile=time atau env MAP_PROFILE ===
+def _profile_mode():
+    query_params = getattr(st, "query_params", None)
+    if query_params is not None:
+        mode = query_params.get("profile")
+    else:  # streamlit < 1.30
+        mode = st.experimental_get_query_params().get("profile", [None])[0]
+    return mode or os.environ.get(PROFILE_ENV, "")
+
+profiler = StageProfiler.from_mode(_profile_mode(), log_path=os.environ.get(PROFILE_LOG_ENV))
+
 st.title("Dynamic Map Viewer")
 st.markdown("""
 Upload file Excel berisi titik lokasi dengan kolom minimal: **Latitude**, **Longitude**.  
@@ -18,96 +53,61 @@ Filter otomatis akan muncul berdasarkan kolom dalam file.
 Pilih warna kustom untuk masing-masing titik jika diperlukan.
 """)
 
-uploaded_file = st.sidebar.file_uploader("Upload File Excel", type=["xlsx"])
-
-@st.cache_data
-def load_data(file):
-    df = pd.read_excel(file)
-    df.columns = df.columns.str.strip()
-    return df
-
-# ================= JSON SAFE SERIALIZER (FIX JSON dumps) =================
-def json_safe(obj):
-    """Make objects JSON-serializable (handles numpy/pandas/time/timedelta)."""
-    if isinstance(obj, (np.integer,)):
-        return int(obj)
-    if isinstance(obj, (np.floating,)):
-        return float(obj)
-    if isinstance(obj, (np.bool_,)):
-        return bool(obj)
-    if isinstance(obj, pd.Timestamp):
-        return obj.isoformat()
-    if isinstance(obj, time):
-        return obj.strftime("%H:%M:%S")
-    if isinstance(obj, timedelta):
-        return int(obj.total_seconds())
-    if obj is None:
-        return None
-    try:
-        # NaN / NaT
-        if isinstance(obj, float) and np.isnan(obj):
-            return None
-    except Exception:
-        pass
-    return str(obj)
-
-# === Helpers untuk normalisasi tampilan nilai (angka & campur tipe) ===
-def normalize_display(v):
-    """Kembalikan string display yang stabil untuk angka & non-angka.
-       - 1 dan 1.0 -> '1'
-       - 1.50 -> '1.5'
-       - selain angka -> str(v)
-    """
-    # Tangani NaN awal
-    try:
-        if pd.isna(v):
-            return None
-    except TypeError:
-        pass
-
-    if isinstance(v, (int, float, np.integer, np.floating)):
-        f = float(v)
-        if np.isfinite(f):
-            if f.is_integer():
-                return str(int(f))
-            else:
-                s = ('%f' % f).rstrip('0').rstrip('.')
-                return s
-        else:
-            return str(v)
-
-    if isinstance(v, str):
-        s = v.strip()
-        if s == "":
-            return s
-        try:
-            f = float(s)
-            if np.isfinite(f):
-                if f.is_integer():
-                    return str(int(f))
-                else:
-                    return ('%f' % f).rstrip('0').rstrip('.')
-        except Exception:
-            pass
-        return s
-    return str(v)
-
-def build_display_map(series: pd.Series):
-    """Buat peta: display_string -> list[nilai_asli], untuk handle 1 vs 1.0."""
-    display_map = {}
-    for v in pd.unique(series.dropna()):
-        key = normalize_display(v)
-        if key is None:
-            continue
-        display_map.setdefault(key, []).append(v)
-    return display_map
+uploaded_files = st.sidebar.file_uploader("Upload File Excel", type=["xlsx"], accept_multiple_files=True)
+
+# Store bersama untuk semua sesi: dataset & turunannya disimpan sekali per
+# isi file; session_state hanya menyimpan kunci, pilihan & warna kustom.
+@st.cache_resource
+def get_dataset_store():
+    return DatasetStore()
+
+dataset_store = get_dataset_store()
+
+def load_data(key, jobs):
+    # kunci = hash isi file (+ sheet); miss -> cache disk (Parquet) atau parse
+    # Excel, beberapa file / sheet di-parse bersamaan lalu digabung
+    return dataset_store.get_or_load(key, lambda: load_workbooks(jobs))
+
+def sheet_names(file_hash, file_bytes):
+    return dataset_store.get_or_load(("sheets", file_hash), lambda: workbook_sheets(file_bytes))
+
+def upload_hashes(files):
+    """Hash isi tiap file upload, dihitung sekali per file (file_id) lalu
+    diingat di sesi; rerun berikutnya tidak meng-hash ulang file besar."""
+    known = st.session_state.get("upload_hashes", {})
+    hashes, result = {}, []
+    for f in files:
+        file_id = getattr(f, "file_id", None)  # streamlit lama: tanpa file_id -> selalu hash
+        file_hash = known.get(file_id) or content_hash(f.getvalue())
+        if file_id is not None:
+            hashes[file_id] = file_hash
+        result.append(file_hash)
+    st.session_state.upload_hashes = hashes  # file yang sudah dilepas ikut terbuang
+    return result
+
+SHEET_MODES = ["Sheet pertama", "Semua sheet", "Pilih sheet"]
 
 # === Initialize Session States ===
 def init_session_state():
     defaults = {
         "kcp_custom_colors": {},
         "enable_cluster": False,
+        "server_cluster": False,
+        "bulk_marker_threshold": 5000,
+        "density_mode": False,
+        "density_shape": "hex",
+        "density_weight": NO_WEIGHT,
+        "density_cell_px": 30,
+        "tile_layer": NO_TILES,                # pyramid tile hasil pre-render (batch_render.py --tiles)
+        "radius_union": False,
+        "nearest_column": NEAREST_NONE,        # kategori untuk jarak titik terdekat
+        "nearest_targets": [],
+        "draw_filter": True,
+        "draw_shapes": [],                     # poligon yang digambar di peta (filter area)
+        "deltas": [],                          # file delta yang diterapkan di atas dataset
         "legend_column": "(Tidak ada)",
+        "legend_sort": "alpha",
+        "legend_show_counts": True,
 
         # --- Resume helpers (auto-restore last session) ---
         "col_lat_saved": None,
@@ -133,53 +133,37 @@ def init_session_state():
 
 init_session_state()
 
-# === Available Colors ===
-available_folium_colors = [
-    "red", "blue", "green", "purple", "orange", "darkred", "lightred",
-    "beige", "darkblue", "darkgreen", "cadetblue", "darkpurple",
-    "white", "pink", "lightblue", "lightgreen", "gray", "black", "lightgray"
-]
-
-
-# === Normalisasi warna folium (handle typo / case) ===
-COLOR_ALIASES = {
-    "darkklue": "darkblue",
-    "darkblu": "darkblue",
-    "darkbue": "darkblue",
-    "lightgren": "lightgreen",
-    "ligtgreen": "lightgreen",
-    "purpel": "purple",
-}
-
-def normalize_folium_color(c):
-    if c is None:
-        return None
-    s = str(c).strip().lower()
-    if s in COLOR_ALIASES:
-        s = COLOR_ALIASES[s]
-    return s
-
 # ================= LOAD from JSON (backward compatible) =================
 st.sidebar.markdown("---")
 st.sidebar.markdown("### Lanjutkan dari JSON")
-uploaded_json = st.sidebar.file_uploader("Upload file JSON", type="json")
+uploaded_json = st.sidebar.file_uploader("Upload file progress (JSON/ZIP)", type=["json", "zip"])
 if uploaded_json is not None:
     if st.sidebar.button("Load Pengaturan JSON"):
-        progress = json.load(uploaded_json)
-
-        # Backward compatible: old format had settings at root
-        if isinstance(progress, dict) and "settings" in progress:
-            settings = progress.get("settings", {})
-            df = pd.DataFrame(progress.get("data", []))
-        else:
-            settings = progress
-            df = pd.DataFrame(progress.get("data", [])) if isinstance(progress, dict) else pd.DataFrame()
+        raw_progress = uploaded_json.getvalue()
+        # ZIP (version 2) atau JSON (version 1 / format lama)
+        settings, df = load_progress(raw_progress)
+        saved_df_key = "progress-" + content_hash(raw_progress)
+        st.session_state.saved_df_key = saved_df_key
 
         st.session_state.kcp_custom_colors = {
             str(k): v for k, v in settings.get("kcp_custom_colors", {}).items()
         }
         st.session_state.enable_cluster = settings.get("enable_cluster", False)
+        st.session_state.server_cluster = settings.get("server_cluster", False)
+        st.session_state.bulk_marker_threshold = int(settings.get("bulk_marker_threshold", 5000))
+        st.session_state.density_mode = settings.get("density_mode", False)
+        st.session_state.density_shape = settings.get("density_shape", "hex")
+        st.session_state.density_weight = settings.get("density_weight", NO_WEIGHT)
+        st.session_state.density_cell_px = int(settings.get("density_cell_px", 30))
+        st.session_state.tile_layer = settings.get("tile_layer", NO_TILES)
+        st.session_state.radius_union = settings.get("radius_union", False)
+        st.session_state.nearest_column = settings.get("nearest_column", NEAREST_NONE)
+        st.session_state.nearest_targets = settings.get("nearest_targets", [])
+        st.session_state.draw_filter = settings.get("draw_filter", True)
+        st.session_state.draw_shapes = settings.get("draw_shapes", [])
         st.session_state.legend_column = settings.get("legend_column", "(Tidak ada)")
+        st.session_state.legend_sort = settings.get("legend_sort", "alpha")
+        st.session_state.legend_show_counts = settings.get("legend_show_counts", True)
         # restore last UI selections (optional)
         st.session_state.col_lat_saved = settings.get("col_lat_saved")
         st.session_state.col_lon_saved = settings.get("col_lon_saved")
@@ -198,19 +182,115 @@ if uploaded_json is not None:
             st.session_state[f"radius_{i}_color"] = cfg.get("color", "red")
             st.session_state[f"radius_{i}_target"] = cfg.get("target", "blue")
 
-        st.session_state.saved_df = df
+        # data ke store bersama + cache disk (jika nanti tergusur dari memori)
+        df = compact_dtypes(df)
+        spill_frame(saved_df_key, df)
+        dataset_store.put(saved_df_key, df)
         st.success("Data dan pengaturan berhasil dimuat dari JSON.")
 
-# ================= MAIN: Load Excel OR from saved_df =================
-if uploaded_file is not None:
-    df = load_data(uploaded_file)
-elif "saved_df" in st.session_state:
-    df = st.session_state.saved_df
+# ================= MAIN: Load Excel OR from saved_df_key =================
+if uploaded_files:
+    uploads = [(f.name, f.getvalue(), h) for f, h in zip(uploaded_files, upload_hashes(uploaded_files))]
+    sheets_per_file = [sheet_names(h, data) for _, data, h in uploads]
+    all_sheets = list(dict.fromkeys(name for sheets in sheets_per_file for name in sheets))
+    sheet_mode = SHEET_MODES[0]
+    if len(all_sheets) > 1:
+        sheet_mode = st.sidebar.radio("Sheet yang dibaca", SHEET_MODES, key="sheet_mode")
+    chosen_sheets = all_sheets
+    if sheet_mode == "Pilih sheet":
+        chosen_sheets = st.sidebar.multiselect("Pilih Sheet", all_sheets, default=all_sheets[:1], key="sheet_selection")
+    selected = []
+    for (name, data, file_hash), sheets in zip(uploads, sheets_per_file):
+        if sheet_mode == "Sheet pertama":
+            picked = sheets[:1]
+        else:
+            picked = [sheet for sheet in sheets if sheet in chosen_sheets]
+        if picked:
+            selected.append((name, data, picked, sheets, file_hash))
+    if not selected:
+        st.info("Pilih minimal satu sheet untuk ditampilkan.")
+        st.stop()
+    jobs = workbook_jobs(selected)
+    dataset_key = workbook_dataset_key(jobs)
+    df = load_data(dataset_key, jobs)
+elif st.session_state.get("saved_df_key"):
+    dataset_key = st.session_state.saved_df_key
+    df = dataset_store.get_or_load(dataset_key, lambda: load_frame_cached(dataset_key))
+    if df is None:
+        st.warning("Data dari file progress sudah tidak ada di cache. Silakan load ulang file progress.")
+        st.stop()
     st.success("Menampilkan data yang dimuat dari JSON sebelumnya.")
 else:
     st.info("Silakan upload file Excel untuk memulai.")
     st.stop()
 
+# === Update Data (Delta): insert / update / delete berdasarkan kolom ID ===
+# Setiap delta menghasilkan dataset baru (kunci turunan); frame hasil
+# sanitasi & index filter dibawa dari versi sebelumnya, hanya baris yang
+# berubah yang dihitung ulang.
+# Sesi hanya menyimpan {name, hash, id_column}; isi file delta (sudah
+# di-parse) ada di store bersama & cache disk dengan kunci hash isinya.
+def delta_frame_key(delta_hash):
+    return "deltafile-" + delta_hash
+
+def load_delta_dataset(base_df, base_key, delta):
+    new_key = delta_key(base_key, delta["hash"], delta["id_column"])
+
+    def build():
+        frame_key = delta_frame_key(delta["hash"])
+        delta_df = dataset_store.get_or_load(frame_key, lambda: load_frame_cached(frame_key))
+        if delta_df is None:
+            raise ValueError("isi file delta sudah tidak ada di cache, silakan upload ulang")
+        new_df, info = apply_delta(base_df, delta_df, delta["id_column"])
+        dataset_store.put(("delta_info", new_key), {"base_key": base_key, **info})
+        return new_df
+
+    return dataset_store.get_or_load(new_key, build), new_key
+
+with st.sidebar.expander("Update Data (Delta)", expanded=bool(st.session_state.deltas)):
+    delta_file = st.file_uploader(
+        "File delta (Excel/CSV)", type=["xlsx", "csv"], key="delta_file",
+        help="Baris dengan ID baru ditambahkan, ID yang ada di-update (sel kosong tidak mengubah nilai). "
+             "Isi kolom 'Aksi' dengan 'hapus' untuk menghapus baris."
+    )
+    id_columns = list(df.columns)
+    id_default = st.session_state.get("name_column_saved")
+    delta_id_column = st.selectbox(
+        "Kolom ID", id_columns, index=id_columns.index(id_default) if id_default in id_columns else 0, key="delta_id_column"
+    )
+    if delta_file is not None and st.button("Terapkan Delta"):
+        delta_bytes = delta_file.getvalue()
+        entry = {"name": delta_file.name, "hash": content_hash(delta_bytes), "id_column": delta_id_column}
+        if any(d["hash"] == entry["hash"] and d["id_column"] == delta_id_column for d in st.session_state.deltas):
+            st.info("Delta ini sudah diterapkan.")
+        else:
+            frame_key = delta_frame_key(entry["hash"])
+            try:
+                if frame_key not in dataset_store:
+                    delta_df = compact_dtypes(read_delta(delta_bytes, delta_file.name))
+                    spill_frame(frame_key, delta_df)
+                    dataset_store.put(frame_key, delta_df)
+                st.session_state.deltas = st.session_state.deltas + [entry]
+            except ValueError as e:
+                st.error(f"File delta {delta_file.name} tidak bisa dibaca: {e}")
+    if st.session_state.deltas and st.button("Batalkan Semua Delta"):
+        st.session_state.deltas = []
+
+for delta in st.session_state.deltas:
+    try:
+        df, dataset_key = load_delta_dataset(df, dataset_key, delta)
+    except ValueError as e:
+        st.sidebar.error(f"Delta {delta['name']} gagal diterapkan: {e}")
+        st.session_state.deltas = [d for d in st.session_state.deltas if d is not delta]
+        break
+    info = dataset_store.get(("delta_info", dataset_key))
+    if info is not None:
+        st.sidebar.caption(
+            f"Delta {delta['name']}: {info['inserted']} baru, {info['updated']} diubah, {info['deleted']} dihapus"
+            + (f", {info['not_found']} ID hapus tidak ditemukan" if info["not_found"] else "")
+        )
+profiler.checkpoint("ingest")
+
 # ================= Pilih Kolom Latitude/Longitude/Nama =================
 st.subheader("Pilih Kolom Latitude, Longitude, dan Nama Titik")
 # auto-select jika pernah disimpan dari JSON / session sebelumnya
@@ -237,45 +317,52 @@ if not col_lat or not col_lon or not name_column:
     st.warning("Silakan pilih ketiga kolom terlebih dahulu.")
     st.stop()
 
-# --- Rename kolom utama ---
-df = df.rename(columns={col_lat: "Latitude", col_lon: "Longitude", name_column: "NamaTitik"})
-
-# --- SANITASI & VALIDASI LAT/LON (tetap simpan baris rusak) ---
-# 1) Ganti koma menjadi titik untuk angka desimal yang ditulis dengan koma
-df["Latitude"]  = df["Latitude"].astype(str).str.replace(",", ".", regex=False)
-df["Longitude"] = df["Longitude"].astype(str).str.replace(",", ".", regex=False)
-
-# 2) Konversi ke numerik (yang gagal -> NaN) -> baris tetap ada
-df["Latitude"]  = pd.to_numeric(df["Latitude"], errors="coerce")
-df["Longitude"] = pd.to_numeric(df["Longitude"], errors="coerce")
-
-# 3) Mask valid untuk kebutuhan MAP saja (df tidak dipangkas)
-mask_valid = (
-    pd.notna(df["Latitude"]) & pd.notna(df["Longitude"]) &
-    np.isfinite(df["Latitude"]) & np.isfinite(df["Longitude"]) &
-    df["Latitude"].between(-90, 90, inclusive="both") &
-    df["Longitude"].between(-180, 180, inclusive="both")
-)
+# --- Rename kolom utama + SANITASI & VALIDASI LAT/LON (tetap simpan baris rusak) ---
+# dihitung sekali per dataset + pilihan kolom, bukan setiap rerun
+def get_prepared_frame(df, key):
+    def build():
+        # dataset hasil delta: pakai hasil versi sebelumnya jika masih di store
+        info = dataset_store.get(("delta_info", key[0]))
+        prev = dataset_store.get(("prepared", info["base_key"]) + key[1:]) if info else None
+        if prev is not None:
+            return update_prepared(prev, df, info, *key[1:])
+        return sanitize_coordinates(df, *key[1:])
+    return dataset_store.get_or_load(("prepared",) + key, build)
+
+df, mask_valid = get_prepared_frame(df, (dataset_key, col_lat, col_lon, name_column))
+profiler.checkpoint("sanitize")
 
 invalid_count = int((~mask_valid).sum())
 if invalid_count > 0:
     st.toast(f"{invalid_count} titik tidak bisa ditampilkan karena koordinat tidak valid", icon="⚠️")
 
 # ================= Sidebar Filters - Cascading (robust untuk angka) =================
+# Index filter dibangun sekali per dataset (+ pilihan kolom utama yang me-rename kolom)
+def get_filter_index(df, key):
+    def build():
+        info = dataset_store.get(("delta_info", key[0]))
+        prev = dataset_store.get(("filter_index", info["base_key"]) + key[1:]) if info else None
+        if prev is not None:
+            # kolom yang sudah diindeks dibawa; hanya baris berubah yang di-factorize
+            index = prev.updated(df, info["kept_old"], info["changed"])
+        else:
+            index = FilterIndex(len(df), normalize_display_values)
+        # kolom yang diindeks belakangan ikut dihitung ke batas memori store
+        index.on_grow = lambda obj, nbytes: dataset_store.grow(store_key, nbytes, obj)
+        return index
+    store_key = ("filter_index",) + key
+    return dataset_store.get_or_load(store_key, build)
+
+filter_index = get_filter_index(df, (dataset_key, col_lat, col_lon, name_column))
+row_mask = filter_index.all_rows()
+
 st.sidebar.title("Filter Lokasi")
-filtered_df = df.copy()
-filter_hierarchy = ["Propinsi", "Kota", "Kanwil"]
-
-for col in filter_hierarchy:
-    if col in filtered_df.columns:
-        disp_map = build_display_map(filtered_df[col])
-        options = ["Pilih Semua"] + sorted(disp_map.keys(), key=str.lower)
-        # restore default selection jika ada
-        _saved = st.session_state.get("filter_selections", {}).get(col, ["Pilih Semua"])
-        # pastikan hanya option yang valid
-        _saved = [v for v in _saved if v in options]
-        if not _saved:
-            _saved = ["Pilih Semua"]
+
+for col in FILTER_HIERARCHY:
+    if col in df.columns:
+        options = [ALL_OPTION] + filter_index.options(df, col, row_mask)
+        # restore default selection jika ada (hanya option yang valid)
+        _saved = restore_selection(st.session_state.get("filter_selections", {}).get(col), options)
 
         selected_displays = st.sidebar.multiselect(
             f"Pilih {col}",
@@ -286,42 +373,32 @@ for col in filter_hierarchy:
         # simpan pilihan untuk resume
         st.session_state.filter_selections[col] = selected_displays
 
-        if "Pilih Semua" not in selected_displays:
-            selected_originals = []
-            for disp in selected_displays:
-                selected_originals.extend(disp_map.get(disp, []))
-            filtered_df = filtered_df[filtered_df[col].isin(selected_originals)]
+        if ALL_OPTION not in selected_displays:
+            row_mask &= filter_index.rows_for(df, col, selected_displays)
 
-if filtered_df.empty:
+if not row_mask.any():
     st.warning("Tidak ada data setelah filter diterapkan.")
     st.stop()
 
 # === Filter Tambahan Dinamis (robust untuk angka & campur tipe) ===
 st.sidebar.markdown("### Filter Tambahan (Opsional)")
-additional_filter_columns = [
-    col for col in filtered_df.columns
-    if col not in filter_hierarchy + ["Latitude", "Longitude", "NamaTitik"]
-]
+extra_filter_columns = additional_filter_columns(df)
 # restore kolom tambahan terakhir (jika ada)
 _saved_cols = st.session_state.get("additional_filter_cols_saved", [])
-_saved_cols = [c for c in _saved_cols if c in additional_filter_columns]
+_saved_cols = [c for c in _saved_cols if c in extra_filter_columns]
 
 selected_additional_filters = st.sidebar.multiselect(
     "Pilih Kolom Untuk Ditambahkan sebagai Filter",
-    additional_filter_columns,
+    extra_filter_columns,
     default=_saved_cols,
     key="additional_filter_cols"
 )
 st.session_state.additional_filter_cols_saved = selected_additional_filters
 
 for col in selected_additional_filters:
-    disp_map = build_display_map(filtered_df[col])
-    options = ["Pilih Semua"] + sorted(disp_map.keys(), key=str.lower)
+    options = [ALL_OPTION] + filter_index.options(df, col, row_mask)
     # restore default selection untuk filter tambahan
-    _saved_vals = st.session_state.get("additional_filter_values", {}).get(col, ["Pilih Semua"])
-    _saved_vals = [v for v in _saved_vals if v in options]
-    if not _saved_vals:
-        _saved_vals = ["Pilih Semua"]
+    _saved_vals = restore_selection(st.session_state.get("additional_filter_values", {}).get(col), options)
 
     selected_displays = st.sidebar.multiselect(
         f"Filter Nilai untuk {col}",
@@ -332,15 +409,41 @@ for col in selected_additional_filters:
     # simpan untuk resume
     st.session_state.additional_filter_values[col] = selected_displays
 
-    if "Pilih Semua" not in selected_displays:
-        selected_originals = []
-        for disp in selected_displays:
-            selected_originals.extend(disp_map.get(disp, []))
-        filtered_df = filtered_df[filtered_df[col].isin(selected_originals)]
-        if filtered_df.empty:
+    if ALL_OPTION not in selected_displays:
+        row_mask &= filter_index.rows_for(df, col, selected_displays)
+        if not row_mask.any():
             st.warning(f"Tidak ada data setelah filter '{col}' diterapkan.")
             st.stop()
 
+# === Filter Area Gambar (poligon/persegi dari toolbar Draw di peta) ===
+st.sidebar.markdown("### Filter Area Gambar")
+draw_shapes = st.session_state.draw_shapes
+st.session_state.draw_filter = st.sidebar.checkbox(
+    "Filter titik dengan area yang digambar di peta",
+    value=st.session_state.draw_filter,
+    help="Gambar polygon / persegi dengan toolbar di kiri peta; hanya titik di dalam area yang dipakai "
+         "untuk peta, legenda, radius & export. Lingkaran, garis & marker tidak dipakai."
+)
+if draw_shapes and st.sidebar.button("Hapus Area Gambar"):
+    st.session_state.draw_shapes = draw_shapes = []
+
+if draw_shapes and st.session_state.draw_filter:
+    # mask area di-cache per dataset + bentuk (bbox prefilter + point-in-polygon)
+    draw_mask = dataset_store.get_or_load(
+        ("draw_mask", dataset_key, col_lat, col_lon, name_column, shapes_key(draw_shapes)),
+        lambda: points_in_shapes(df["Latitude"], df["Longitude"], draw_shapes),
+    )
+    row_mask &= draw_mask
+    st.sidebar.caption(f"{len(draw_shapes)} area digambar, {int(row_mask.sum()):,} titik di dalam area.")
+    if not row_mask.any():
+        st.warning("Tidak ada titik di dalam area yang digambar. Gambar ulang area atau klik 'Hapus Area Gambar'.")
+        st.stop()
+elif draw_shapes:
+    st.sidebar.caption(f"{len(draw_shapes)} area digambar (filter tidak aktif).")
+
+# hasil akhir semua filter disimpan sebagai mask baris (tanpa salinan df)
+profiler.checkpoint("filters")
+
 # === Sidebar Warna ===
 st.sidebar.markdown("---")
 st.sidebar.subheader("Pilih Warna Untuk Titik Tertentu")
@@ -349,10 +452,8 @@ warna_column = st.sidebar.selectbox("Pilih Kolom Referensi Warna", df.columns, i
 st.session_state.warna_column_saved = warna_column
 
 if warna_column:
-    name_list = sorted(
-        pd.Series(df[warna_column].dropna().map(normalize_display)).dropna().unique(),
-        key=lambda s: s.lower()
-    )
+    # nilai display unik (urut case-insensitive) langsung dari index filter
+    name_list = filter_index.options(df, warna_column)
     selected_names = st.sidebar.multiselect("Pilih Nilai dari Kolom Warna", name_list)
     color_choice = st.sidebar.selectbox("Pilih Warna", available_folium_colors)
     if selected_names:
@@ -376,6 +477,20 @@ legend_column = st.sidebar.selectbox(
     index=legend_options.index(default_legend)
 )
 st.session_state.legend_column = legend_column
+if legend_column != NO_LEGEND:
+    if st.session_state.legend_sort not in LEGEND_SORTS:
+        st.session_state.legend_sort = "alpha"
+    st.session_state.legend_sort = st.sidebar.radio(
+        "Urutkan Legenda",
+        list(LEGEND_SORTS),
+        index=list(LEGEND_SORTS).index(st.session_state.legend_sort),
+        format_func=LEGEND_SORTS.get,
+        horizontal=True
+    )
+    st.session_state.legend_show_counts = st.sidebar.checkbox(
+        "Tampilkan Jumlah Titik di Legenda",
+        value=st.session_state.legend_show_counts
+    )
 
 
 # === Radius Bertingkat (3 Tingkat) ===
@@ -388,211 +503,449 @@ for i in range(1, 4):
             st.number_input(f"Jarak Radius #{i} (km)", min_value=0.0, step=0.5, key=f"radius_{i}_distance")
             st.selectbox(f"Warna Lingkaran #{i}", available_folium_colors, key=f"radius_{i}_color")
             st.selectbox(f"Warna Target Titik #{i}", available_folium_colors, key=f"radius_{i}_target")
+st.session_state.radius_union = st.sidebar.checkbox(
+    "Gabungkan Lingkaran (Poligon Cakupan)",
+    value=st.session_state.radius_union and coverage_available(),
+    disabled=not coverage_available(),
+    help="Lingkaran tiap tingkat digabung menjadi satu poligon & luas cakupannya dihitung. "
+         "Jauh lebih ringan untuk ribuan titik target (butuh shapely)."
+)
+
+# === Jarak Titik Terdekat per Kategori ===
+st.sidebar.markdown("---")
+st.sidebar.subheader("Jarak Titik Terdekat")
+nearest_options = [NEAREST_NONE, NEAREST_MARKER_COLOR] + [c for c in df.columns if c not in ("Latitude", "Longitude")]
+if st.session_state.nearest_column not in nearest_options:
+    st.session_state.nearest_column = NEAREST_NONE
+st.session_state.nearest_column = st.sidebar.selectbox(
+    "Kolom Kategori",
+    nearest_options,
+    index=nearest_options.index(st.session_state.nearest_column),
+    help="Untuk tiap titik: jarak & nama titik terdekat dengan kategori target "
+         "(mis. kompetitor / cabang sendiri terdekat). Dihitung atas semua titik berkoordinat valid."
+)
+if st.session_state.nearest_column != NEAREST_NONE:
+    if st.session_state.nearest_column == NEAREST_MARKER_COLOR:
+        target_options = available_folium_colors
+    else:
+        target_options = filter_index.options(df, st.session_state.nearest_column)
+    st.session_state.nearest_targets = st.sidebar.multiselect(
+        "Kategori Target",
+        target_options,
+        # bukan restore_selection: tidak ada opsi "Pilih Semua" di sini
+        default=[t for t in st.session_state.nearest_targets if t in target_options],
+    )
+else:
+    st.session_state.nearest_targets = []
 
 st.sidebar.markdown("---")
 st.session_state.enable_cluster = st.sidebar.checkbox(
     "Aktifkan Cluster Marker",
     value=st.session_state.enable_cluster
 )
+st.session_state.server_cluster = st.sidebar.checkbox(
+    "Cluster Server (Sesuai Viewport)",
+    value=st.session_state.server_cluster,
+    help="Untuk data sangat besar: hanya cluster/titik di area peta yang terlihat yang dikirim ke browser."
+)
+st.session_state.density_mode = st.sidebar.checkbox(
+    "Mode Kepadatan (Heatmap/Hexbin)",
+    value=st.session_state.density_mode,
+    help="Ganti marker dengan sel kepadatan yang dihitung di server sesuai zoom & area peta."
+)
+if st.session_state.density_mode:
+    shape_keys = list(DENSITY_SHAPES)
+    st.session_state.density_shape = st.sidebar.selectbox(
+        "Bentuk Kepadatan",
+        shape_keys,
+        index=shape_keys.index(st.session_state.density_shape) if st.session_state.density_shape in shape_keys else 0,
+        format_func=DENSITY_SHAPES.get,
+    )
+    weight_options = [NO_WEIGHT] + [
+        c for c in df.columns
+        if c not in ("Latitude", "Longitude") and pd.api.types.is_numeric_dtype(df[c].dtype)
+    ]
+    st.session_state.density_weight = st.sidebar.selectbox(
+        "Bobot Kepadatan (opsional)",
+        weight_options,
+        index=weight_options.index(st.session_state.density_weight) if st.session_state.density_weight in weight_options else 0,
+        help="Kolom numerik yang dijumlahkan per sel; tanpa bobot = jumlah titik."
+    )
+    st.session_state.density_cell_px = int(st.sidebar.slider(
+        "Ukuran Sel (piksel)", min_value=10, max_value=80, step=5,
+        value=int(st.session_state.density_cell_px),
+    ))
+tile_options = [NO_TILES] + list_pyramids()
+if st.session_state.tile_layer not in tile_options:
+    st.session_state.tile_layer = NO_TILES
+st.session_state.tile_layer = st.sidebar.selectbox(
+    "Layer Tile Offline",
+    tile_options,
+    index=tile_options.index(st.session_state.tile_layer),
+    help="Titik digambar dari tile PNG hasil pre-render (python batch_render.py ... --tiles static/tiles), "
+         "ringan untuk jutaan titik. Isi tile tetap seperti saat dirender: filter & warna tidak mengubahnya."
+)
+st.session_state.bulk_marker_threshold = int(st.sidebar.number_input(
+    "Mode Marker Massal di atas (jumlah titik)",
+    min_value=0,
+    step=1000,
+    value=int(st.session_state.bulk_marker_threshold),
+    help="Di atas jumlah ini semua titik dikirim sebagai satu payload ringkas."
+))
+
+profiler.checkpoint("sidebar")
 
-# === Save Progress (JSON) ===
+# === Save Progress (dibuat hanya saat diminta) ===
 st.sidebar.markdown("---")
-progress = {
-    "version": 1,
-    "data": df.to_dict(orient="records"),
-    "settings": {
-        "kcp_custom_colors": st.session_state.kcp_custom_colors,
-        "enable_cluster": st.session_state.enable_cluster,
-        "legend_column": st.session_state.get("legend_column", "(Tidak ada)"),
-        # resume state
-        "col_lat_saved": st.session_state.get("col_lat_saved"),
-        "col_lon_saved": st.session_state.get("col_lon_saved"),
-        "name_column_saved": st.session_state.get("name_column_saved"),
-        "warna_column_saved": st.session_state.get("warna_column_saved"),
-        "filter_selections": st.session_state.get("filter_selections", {}),
-        "additional_filter_cols_saved": st.session_state.get("additional_filter_cols_saved", []),
-        "additional_filter_values": st.session_state.get("additional_filter_values", {}),
-
-        "radius": {
-            i: {
-                "enabled": st.session_state.get(f"radius_{i}_enabled", False),
-                "distance": st.session_state.get(f"radius_{i}_distance", 1.0),
-                "color": st.session_state.get(f"radius_{i}_color", "red"),
-                "target": st.session_state.get(f"radius_{i}_target", "blue"),
-            }
-            for i in range(1, 4)
+progress_settings = {
+    "kcp_custom_colors": st.session_state.kcp_custom_colors,
+    "enable_cluster": st.session_state.enable_cluster,
+    "server_cluster": st.session_state.server_cluster,
+    "bulk_marker_threshold": st.session_state.bulk_marker_threshold,
+    "density_mode": st.session_state.density_mode,
+    "density_shape": st.session_state.density_shape,
+    "density_weight": st.session_state.density_weight,
+    "density_cell_px": st.session_state.density_cell_px,
+    "tile_layer": st.session_state.tile_layer,
+    "radius_union": st.session_state.radius_union,
+    "nearest_column": st.session_state.nearest_column,
+    "nearest_targets": st.session_state.nearest_targets,
+    "draw_filter": st.session_state.draw_filter,
+    "draw_shapes": st.session_state.draw_shapes,
+    "legend_column": st.session_state.get("legend_column", "(Tidak ada)"),
+    "legend_sort": st.session_state.get("legend_sort", "alpha"),
+    "legend_show_counts": st.session_state.get("legend_show_counts", True),
+    # resume state
+    "col_lat_saved": st.session_state.get("col_lat_saved"),
+    "col_lon_saved": st.session_state.get("col_lon_saved"),
+    "name_column_saved": st.session_state.get("name_column_saved"),
+    "warna_column_saved": st.session_state.get("warna_column_saved"),
+    "filter_selections": st.session_state.get("filter_selections", {}),
+    "additional_filter_cols_saved": st.session_state.get("additional_filter_cols_saved", []),
+    "additional_filter_values": st.session_state.get("additional_filter_values", {}),
+
+    "radius": {
+        i: {
+            "enabled": st.session_state.get(f"radius_{i}_enabled", False),
+            "distance": st.session_state.get(f"radius_{i}_distance", 1.0),
+            "color": st.session_state.get(f"radius_{i}_color", "red"),
+            "target": st.session_state.get(f"radius_{i}_target", "blue"),
         }
+        for i in range(1, 4)
     }
 }
-
-json_bytes = json.dumps(progress, default=json_safe, ensure_ascii=False, indent=2).encode("utf-8")
-st.sidebar.download_button(
-    "Simpan Progress (JSON)",
-    data=json_bytes,
-    file_name="saved_progress.json",
-    mime="application/json"
+# data progress = df setelah rename kolom utama -> ditentukan dataset_key + pilihan kolom
+progress_key = (dataset_key, col_lat, col_lon, name_column, settings_hash(progress_settings))
+progress_format = st.sidebar.radio(
+    "Format Simpan Progress",
+    ["ZIP (ringkas)", "JSON (lama)"],
+    horizontal=True,
+    key="progress_format"
 )
+# file yang sudah disiapkan (sesi mana pun, state sama) langsung bisa diunduh
+progress_file_key = ("progress_file", progress_key, progress_format)
+progress_bytes = dataset_store.get(progress_file_key)
+if progress_bytes is None and st.sidebar.button("Siapkan File Progress"):
+    if progress_format.startswith("ZIP"):
+        progress_bytes = dump_progress_zip(df, progress_settings)
+    else:
+        progress_bytes = dump_progress_json(df, progress_settings)
+    dataset_store.put(progress_file_key, progress_bytes)
+
+if progress_bytes is not None:
+    is_zip = progress_format.startswith("ZIP")
+    st.sidebar.download_button(
+        "Simpan Progress (ZIP)" if is_zip else "Simpan Progress (JSON)",
+        data=progress_bytes,
+        file_name="saved_progress.zip" if is_zip else "saved_progress.json",
+        mime="application/zip" if is_zip else "application/json"
+    )
 
-# ================= MAIN MAP (gunakan df_map agar NaN tidak bikin crash) =================
-df_map = filtered_df[mask_valid.reindex(filtered_df.index, fill_value=False)].copy()
-
-# Center map: kalau tidak ada titik valid, fallback Indonesia
-if not df_map.empty:
-    lat_center = float(df_map["Latitude"].mean())
-    lon_center = float(df_map["Longitude"].mean())
-else:
-    lat_center, lon_center = -2.5489, 118.0149
-
-m = folium.Map(location=[lat_center, lon_center], zoom_start=6)
-plugins.Draw(export=True).add_to(m)
-
-marker_group = folium.FeatureGroup(name="Markers")
-marker_cluster = plugins.MarkerCluster() if st.session_state.enable_cluster else None
-
-# Helper: resolve warna marker sesuai aturan asli (custom -> kolom "Warna" -> default blue)
-def resolve_marker_color(row):
-    """Tentukan warna marker secara konsisten.
-    Prioritas:
-    1) Custom mapping (berdasarkan warna_column yang dipilih)
-    2) Kolom Warna_Akhir (jika ada & tidak kosong)
-    3) Kolom Warna (jika ada & tidak kosong)
-    4) Default 'blue'
-    """
-    # default
-    warna = "blue"
-
-    # 1) custom mapping (opsional, hanya jika warna_column dipilih)
-    try:
-        ref_value = row.get(warna_column) if warna_column else None
-    except Exception:
-        ref_value = None
-
-    disp_key = None
-    if ref_value is not None and not pd.isna(ref_value):
-        disp_key = normalize_display(ref_value)
-
-    if disp_key and disp_key in st.session_state.kcp_custom_colors:
-        return normalize_folium_color(st.session_state.kcp_custom_colors[disp_key])
-
-    # 2) prefer Warna_Akhir jika tersedia (mis. hasil export sebelumnya)
-    if "Warna_Akhir" in row.index and pd.notna(row.get("Warna_Akhir")):
-        warna_akhir = str(row.get("Warna_Akhir")).strip()
-        if warna_akhir:
-            return normalize_folium_color(warna_akhir)
-
-    # 3) fallback Warna
-    if "Warna" in row.index and pd.notna(row.get("Warna")):
-        warna_col = str(row.get("Warna")).strip()
-        if warna_col:
-            return normalize_folium_color(warna_col)
-
-    return normalize_folium_color(warna)
+profiler.checkpoint("progress_save")
 
-for _, row in df_map.iterrows():
-    lat, lon = row["Latitude"], row["Longitude"]
-    warna = resolve_marker_color(row)
+# ================= MAIN MAP (gunakan df_map agar NaN tidak bikin crash) =================
+# Warna dihitung sekali per rerun, dipakai ulang oleh peta, legenda & export
+# (hanya kolom warna & kolom peta yang di-slice, bukan seluruh df)
+marker_colors = resolve_marker_colors(
+    df.loc[row_mask, color_columns(df, warna_column)], warna_column, st.session_state.kcp_custom_colors
+)
+df_map = map_frame(
+    df, row_mask, mask_valid,
+    extra_columns=[st.session_state.get("legend_column"), st.session_state.density_weight],
+)
+map_colors = marker_colors[mask_valid.to_numpy()[row_mask]]
+profiler.checkpoint("colors")
 
-    marker = folium.Marker(
-        location=[lat, lon],
-        popup=row.get("NamaTitik", ""),
-        icon=folium.Icon(color=normalize_folium_color(warna) if normalize_folium_color(warna) in available_folium_colors else "blue", icon="info-sign")
+# Jarak titik terdekat: atas semua titik valid (tidak tergantung filter),
+# dipakai ulang oleh popup peta & export
+nearest_state = {
+    k: progress_settings[k] for k in ("nearest_column", "nearest_targets", "warna_column_saved", "kcp_custom_colors")
+}
+if nearest_state["nearest_column"] != NEAREST_MARKER_COLOR:
+    # warna hanya memengaruhi hasil jika kategorinya warna marker
+    nearest_state.pop("warna_column_saved")
+    nearest_state.pop("kcp_custom_colors")
+nearest = dataset_store.get_or_load(
+    ("nearest", dataset_key, col_lat, col_lon, name_column, settings_hash(nearest_state)),
+    lambda: nearest_enrichment(df, mask_valid, progress_settings),
+) if progress_settings["nearest_targets"] else None
+profiler.checkpoint("nearest")
+
+# Peta dibangun ulang hanya jika state yang memengaruhinya berubah. Semua
+# pengaturan yang disimpan di progress (filter, warna, radius, cluster,
+# legenda, kolom utama) memengaruhi peta; pilihan yang belum di-"Tandai" tidak.
+def build_map_payload():
+    center = map_center(df_map)
+    map_icon_colors = icon_colors(map_colors)
+
+    # Radius Bertingkat: lingkaran + analitik (logika sama dengan batch_render.py)
+    layers, radius_details, radius_summary = radius_layers(
+        df_map, map_colors, progress_settings["radius"], union=st.session_state.radius_union
     )
 
-    if st.session_state.enable_cluster:
-        marker_cluster.add_child(marker)
+    popups = nearest_popups(df_map, nearest, progress_settings["nearest_targets"]) if nearest is not None else None
+    viewport_index = density = None
+    tile_meta = load_meta(st.session_state.tile_layer) if st.session_state.tile_layer != NO_TILES else None
+    tile_template = (
+        tile_url(st.session_state.tile_layer, st.get_option("server.baseUrlPath") or "") if tile_meta else None
+    )
+    if tile_template:
+        # titik sudah ada di tile PNG (pre-render); marker tidak dikirim ke browser
+        layers.append(tile_layer(st.session_state.tile_layer, tile_meta, tile_template))
+    elif st.session_state.density_mode:
+        # sel kepadatan dihitung per zoom/viewport oleh show_map (ganti marker)
+        weight_column = st.session_state.density_weight
+        density = {
+            "lat": df_map["Latitude"].to_numpy(dtype=np.float32),
+            "lon": df_map["Longitude"].to_numpy(dtype=np.float32),
+            "weights": density_weights(df_map, weight_column),
+            "weight_label": weight_column if weight_column != NO_WEIGHT else None,
+            "shape": st.session_state.density_shape,
+            "cell_px": st.session_state.density_cell_px,
+        }
+    elif st.session_state.server_cluster:
+        # marker dikirim per viewport oleh show_map, bukan dirender di sini
+        viewport_index = ViewportClusterIndex(df_map["Latitude"], df_map["Longitude"], map_icon_colors)
     else:
-        marker.add_to(marker_group)
+        layers.append(marker_layer(
+            df_map, map_icon_colors,
+            enable_cluster=st.session_state.enable_cluster,
+            bulk_threshold=st.session_state.bulk_marker_threshold,
+            popups=popups,
+        ))
+
+    return {
+        "center": center,
+        "layers": prerender(layers),
+        "legend_html": density_legend_html(density["shape"], density["weight_label"]) if density else legend_html(
+            df_map, map_colors, st.session_state.get("legend_column", NO_LEGEND),
+            sort=st.session_state.legend_sort, show_counts=st.session_state.legend_show_counts,
+        ),
+        "density": density,
+        "viewport_index": viewport_index,
+        "viewport_names": (
+            (df_map["NamaTitik"] if popups is None else popups).astype(str).to_numpy()
+            if viewport_index is not None else None
+        ),
+        "radius_details": radius_details,
+        "radius_summary": radius_summary,
+    }
 
-    # Tambahkan Lingkaran Bertingkat
-    for i in range(1, 4):
-        if st.session_state.get(f"radius_{i}_enabled"):
-            target = st.session_state.get(f"radius_{i}_target")
-            if warna == target:
-                radius_km = st.session_state.get(f"radius_{i}_distance", 1.0)
-                circle_color = st.session_state.get(f"radius_{i}_color", "red")
-                folium.Circle(
-                    radius=radius_km * 1000,
-                    location=[lat, lon],
-                    color=circle_color,
-                    fill=True,
-                    fill_opacity=0.2
-                ).add_to(m)
-
-if st.session_state.enable_cluster and marker_cluster is not None:
-    marker_cluster.add_to(m)
-else:
-    marker_group.add_to(m)
-
-# === Legenda Peta (Dinamis) ===
-if st.session_state.get("legend_column", "(Tidak ada)") != "(Tidak ada)":
-    legend_col = st.session_state.get("legend_column")
-    if legend_col in df_map.columns:
-        from collections import defaultdict, Counter
-
-        # hitung warna paling sering untuk setiap label legenda
-        color_counter = defaultdict(Counter)
-        for _, r in df_map.iterrows():
-            v = r.get(legend_col)
-            if v is None or pd.isna(v):
-                continue
-            label = normalize_display(v)
-            if label is None or label == "":
-                continue
-            c = resolve_marker_color(r)
-            color_counter[label][c] += 1
-
-        legend_colors = {
-            label: cnt.most_common(1)[0][0]
-            for label, cnt in color_counter.items()
-        }
+# pyramid yang dirender ulang dengan nama sama -> metadata baru, payload dibangun ulang
+tile_version = meta_version(st.session_state.tile_layer) if st.session_state.tile_layer != NO_TILES else None
+map_key = (dataset_key, col_lat, col_lon, name_column, settings_hash(progress_settings), tile_version)
+map_payload = dataset_store.get_or_load(("map",) + map_key, build_map_payload)
+radius_details = map_payload["radius_details"]
+radius_summary = map_payload["radius_summary"]
+profiler.checkpoint("map_build")
+
+# Interaksi peta (pan/zoom) hanya menjalankan ulang fragment ini, bukan seluruh script
+_fragment = getattr(st, "fragment", None) or (lambda func: func)
+
+# === Cluster Server (viewport) ===
+
+def current_view(center, map_state, zoom_start=6, size_px=(1200, 700)):
+    """(bounds, zoom) dari nilai st_folium terakhir; perkiraan dari center jika belum ada."""
+    if map_state:
+        b = map_state.get("bounds") or {}
+        sw, ne = b.get("_southWest") or {}, b.get("_northEast") or {}
+        if None not in (sw.get("lat"), sw.get("lng"), ne.get("lat"), ne.get("lng")):
+            zoom = map_state.get("zoom") or zoom_start
+            return (sw["lat"], sw["lng"], ne["lat"], ne["lng"]), zoom
+    deg_per_px = 360.0 / (256 * 2 ** zoom_start)
+    half_w, half_h = size_px[0] / 2 * deg_per_px, size_px[1] / 2 * deg_per_px
+    return (center[0] - half_h, center[1] - half_w, center[0] + half_h, center[1] + half_w), zoom_start
+
+def viewport_layer(payload, map_state):
+    """FeatureGroup berisi cluster/titik yang terlihat pada viewport saat ini."""
+    index = payload["viewport_index"]
+    names = payload["viewport_names"]
+    bounds, zoom = current_view(payload["center"], map_state)
+    clusters, points = index.query(bounds, zoom)
+
+    group = folium.FeatureGroup(name="Markers")
+    for lat, lon, count, color in clusters.itertuples(index=False):
+        size = 28 + 8 * int(np.log10(count))
+        bg = FOLIUM_COLOR_HEX.get(color, FOLIUM_COLOR_HEX["blue"])
+        folium.Marker(
+            location=[lat, lon],
+            tooltip=f"{count} titik",
+            icon=folium.DivIcon(
+                icon_size=(size, size),
+                icon_anchor=(size // 2, size // 2),
+                html=(
+                    f"<div style='width:{size}px;height:{size}px;line-height:{size}px;border-radius:50%;"
+                    f"background:{bg};opacity:0.85;color:white;font-weight:bold;text-align:center;"
+                    f"border:2px solid white;box-shadow:0 0 3px rgba(0,0,0,0.5);'>{count}</div>"
+                ),
+            ),
+        ).add_to(group)
+    for pos in points:
+        folium.Marker(
+            location=[index.lat[pos], index.lon[pos]],
+            popup=names[pos],
+            icon=folium.Icon(color=index.palette[index.color_codes[pos]], icon="info-sign")
+        ).add_to(group)
+    return group
+
+@_fragment
+def show_map(payload):
+    m = folium.Map(location=payload["center"], zoom_start=6)
+    # area tersimpan dimasukkan ke layer Draw agar tetap ada setelah peta dirender ulang
+    drawn_items = drawn_items_group(st.session_state.draw_shapes).add_to(m)
+    plugins.Draw(export=True, feature_group=drawn_items).add_to(m)
+    PrerenderedLayer(**payload["layers"]).add_to(m)
+    if payload["legend_html"]:
+        m.get_root().html.add_child(folium.Element(payload["legend_html"]))
+
+    dynamic_layer = None
+    density = payload.get("density")
+    if density is not None:
+        # sel dihitung ulang sesuai zoom & area yang terlihat
+        bounds, zoom = current_view(payload["center"], st.session_state.get("main_map"))
+        dynamic_layer = density_layer(
+            density["lat"], density["lon"], zoom, weights=density["weights"], shape=density["shape"],
+            cell_px=density["cell_px"], bounds=bounds, weight_label=density["weight_label"],
+        )
+    elif payload.get("viewport_index") is not None:
+        # bounds/zoom terakhir dari browser -> hanya kirim isi viewport
+        dynamic_layer = viewport_layer(payload, st.session_state.get("main_map"))
+    map_state = st_folium(
+        m,
+        key="main_map",
+        feature_group_to_add=dynamic_layer,
+        use_container_width=True,
+        height=700
+    )
 
-        # batasi agar legend tidak terlalu panjang
-        legend_labels_sorted = sorted(legend_colors.keys(), key=lambda s: str(s).lower())
-        max_items = 25
-        if len(legend_labels_sorted) > max_items:
-            legend_labels_sorted = legend_labels_sorted[:max_items] + ["..."]
-
-        legend_items = ""
-        for l in legend_labels_sorted:
-            if l == "...":
-                legend_items += "<div style='margin-top:6px; color:#666;'>...</div>"
-                continue
-            c = legend_colors.get(l, "blue")
-            legend_items += (
-                "<div style='display:flex;align-items:center;margin-bottom:4px;'>"
-                f"<div style='width:12px;height:12px;border-radius:50%;background:{c};"
-                f"{'border:1px solid #ccc;' if c == 'white' else ''}"
-                "margin-right:6px;'></div>"
-                f"{l}</div>"
+    # Area digambar / dihapus di browser -> filter berubah -> jalankan ulang
+    # seluruh script (bukan hanya fragment) agar legenda, radius & export ikut.
+    # Hanya nilai baru dari browser yang diproses, bukan nilai lama yang
+    # masih tersimpan setelah area dihapus lewat sidebar / load progress.
+    drawings = (map_state or {}).get("all_drawings")
+    if drawings is not None:
+        shapes = normalize_drawings(drawings)
+        seen_key = shapes_key(shapes)
+        if seen_key != st.session_state.get("draw_seen_key"):
+            st.session_state.draw_seen_key = seen_key
+            if seen_key != shapes_key(st.session_state.draw_shapes):
+                st.session_state.draw_shapes = shapes
+                (getattr(st, "rerun", None) or st.experimental_rerun)()
+
+show_map(map_payload)
+profiler.checkpoint("map_render")
+
+# === Ringkasan Analitik Radius ===
+if radius_summary:
+    st.subheader("Analitik Radius Bertingkat")
+    st.caption("Jumlah titik lain (dari titik yang tampil di peta) dalam jarak radius tiap titik target.")
+    if "Luas Cakupan (km²)" in radius_summary[0]:
+        st.caption("Luas cakupan = luas gabungan lingkaran tiap tingkat (area yang tumpang tindih dihitung sekali).")
+    st.dataframe(pd.DataFrame(radius_summary), hide_index=True, use_container_width=True)
+    for i, detail in radius_details.items():
+        with st.expander(f"Detail Radius #{i} per Titik Target"):
+            st.dataframe(
+                detail.sort_values("Jumlah_Titik", ascending=False),
+                hide_index=True,
+                use_container_width=True
             )
 
-        legend_html = f"""
-        <div style="position:absolute; bottom:10px; right:10px; z-index:9999; background-color:white;
-            padding:10px; border:2px solid #ccc; border-radius:8px; box-shadow:2px 2px 5px rgba(0,0,0,0.3);
-            font-size:14px; max-width:220px; max-height:240px; overflow:auto;">
-            <b>Legenda ({legend_col}):</b><br>
-            <div style="margin-top:5px;">{legend_items}</div>
-        </div>
-        """
-        m.get_root().html.add_child(folium.Element(legend_html))
-
-st_folium(m, use_container_width=True, height=700)
-
-# === Export Data (tetap pakai filtered_df agar baris rusak tetap ikut export) ===
-df_export = filtered_df.copy()
-
-def get_final_color(row):
-    # konsisten dengan warna di peta
-    return resolve_marker_color(row)
-
-df_export["Warna_Akhir"] = df_export.apply(get_final_color, axis=1)
-
-buffer = BytesIO()
-df_export.to_excel(buffer, index=False, engine="openpyxl")
-buffer.seek(0)
-st.download_button(
-    "Download Seluruh Data (Excel)",
-    data=buffer,
-    file_name="seluruh_data_dengan_warna.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# === Ringkasan Jarak Titik Terdekat ===
+if nearest is not None:
+    st.subheader("Jarak Titik Terdekat per Kategori")
+    st.caption("Jarak ke titik terdekat berkategori target (dicari di semua titik berkoordinat valid), "
+               "dirangkum untuk titik yang tampil di peta. Detail per titik ada di popup & export.")
+    st.dataframe(
+        pd.DataFrame(nearest_summary(nearest, progress_settings["nearest_targets"], df_map.index)),
+        hide_index=True,
+        use_container_width=True
+    )
+
+profiler.checkpoint("radius_table")
+
+# === Export Data (tetap pakai semua baris hasil filter agar baris rusak tetap ikut export) ===
+# Dibuat hanya saat diminta; di-cache berdasarkan state filter & warna
+export_state = {
+    k: progress_settings[k]
+    for k in ("warna_column_saved", "kcp_custom_colors", "filter_selections",
+              "additional_filter_cols_saved", "additional_filter_values", "radius",
+              "draw_filter", "draw_shapes", "nearest_column", "nearest_targets")
+}
+export_key = (dataset_key, col_lat, col_lon, name_column, settings_hash(export_state))
+
+export_col, _ = st.columns([1, 2])
+export_format = export_col.radio(
+    "Format Export",
+    list(EXPORT_FORMATS),
+    horizontal=True,
+    key="export_format",
+    help="CSV & Parquet jauh lebih cepat untuk data besar."
 )
+export_file_key = ("export_file", export_key, export_format)
+export_data = dataset_store.get(export_file_key)
+export_too_big = export_format == "Excel" and int(row_mask.sum()) + 1 > EXCEL_MAX_ROWS
+if export_too_big:
+    st.warning(f"{int(row_mask.sum()):,} baris melebihi batas Excel ({EXCEL_MAX_ROWS - 1:,} baris data). "
+               "Pilih format CSV atau Parquet.")
+if export_data is None and st.button("Siapkan File Export", disabled=export_too_big):
+    with st.spinner("Menyiapkan file export..."):
+        df_export = export_frame(df, row_mask, marker_colors, radius_details, nearest)
+        export_data = dataset_store.put(export_file_key, export_bytes(df_export, export_format))
+
+if export_data is not None:
+    ext, mime = EXPORT_FORMATS[export_format]
+    st.download_button(
+        "Download Seluruh Data (Excel)" if ext == "xlsx" else f"Download Seluruh Data ({export_format})",
+        data=export_data,
+        file_name=f"seluruh_data_dengan_warna.{ext}",
+        mime=mime
+    )
+profiler.checkpoint("export")
+
+# === Panel Instrumentasi ===
+if profiler.enabled:
+    with st.sidebar.expander("Instrumentasi (rerun terakhir)"):
+        st.caption(f"Total {profiler.total_seconds:.3f} s · {len(df):,} baris · {len(df_map):,} titik di peta")
+        st.dataframe(profiler.frame(), hide_index=True, use_container_width=True)
+        if profiler.memory:
+            st.caption("peak_mb / current_mb = alokasi Python/NumPy per tahap (tracemalloc) untuk seluruh "
+                       "proses, bukan per sesi: rerun sesi lain yang berjalan bersamaan ikut terhitung.")
+        st.markdown("**Laporan Memori (rerun ini)**")
+        st.dataframe(memory_report({
+            "dataset (df)": df,
+            "peta (df_map)": df_map,
+            "payload peta": map_payload,
+            "index filter": filter_index,
+            "state sesi": dict(st.session_state),
+        }), hide_index=True, use_container_width=True)
+        store_stats = dataset_store.stats()
+        st.caption(
+            f"Store bersama: {store_stats['entries']} entri, {store_stats['total_mb']:,.1f} / "
+            f"{store_stats['max_mb']:,.0f} MB (hit {store_stats['hits']}, miss {store_stats['misses']}, "
+            f"dibuang {store_stats['evictions']})"
+        )
+        peak_rss = process_peak_rss_mb()
+        if peak_rss is not None:
+            st.caption(f"RSS puncak proses (semua sesi): {peak_rss:,.1f} MB")
+    profiler.write_log(dataset_key=dataset_key, rows=len(df), map_points=len(df_map))
+profiler.finish()
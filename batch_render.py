@@ -0,0 +1,235 @@
+"""Render peta HTML & export data tanpa UI, dari file progress.
+
+File progress (JSON/ZIP hasil tombol "Simpan Progress") berisi pengaturan
+filter, warna, radius & legenda. Setiap file menjadi satu job; job dibagi ke
+beberapa proses. Logika filter/warna/radius sama dengan app.py (map_core).
+
+Contoh:
+    python batch_render.py progress/*.json --excel data.xlsx --out hasil --workers 8
+
+Tanpa --excel, data yang tersimpan di dalam file progress yang dipakai.
+
+Pre-render pyramid tile PNG untuk dataset sangat besar (dipilih di app lewat
+"Layer Tile Offline"; folder harus di bawah static/):
+    python batch_render.py progress.json --excel data.xlsx --tiles static/tiles --no-html --export-format none
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import folium
+
+from density_grid import NO_WEIGHT, density_layer, density_legend_html, density_weights
+from draw_filter import drawn_items_group
+from export_io import EXPORT_FORMATS, export_bytes
+from filter_index import FilterIndex
+from ingest_cache import load_excel_cached
+from map_core import (
+    NO_LEGEND, apply_saved_filters, color_columns, export_frame, icon_colors, legend_html, map_center,
+    map_frame, marker_layer, normalize_display_values, radius_layers, resolve_marker_colors, sanitize_coordinates,
+)
+from nearest_neighbor import nearest_enrichment, nearest_popups
+from tile_pyramid import render_pyramid
+from progress_io import load_progress
+
+# dataset Excel per proses worker: dibaca sekali, dipakai semua job berikutnya
+_DATASETS = {}
+
+
+def _load_dataset(excel_path):
+    df = _DATASETS.get(excel_path)
+    if df is None:
+        # parse pertama di-spill ke cache disk; worker lain cukup baca Parquet
+        df = load_excel_cached(Path(excel_path).read_bytes())
+        _DATASETS[excel_path] = df
+    return df
+
+
+def _main_columns(df, settings):
+    """Kolom lat/lon/nama dari settings. Data yang disimpan di file progress
+    sudah di-rename ke Latitude/Longitude/NamaTitik, jadi nama itu dipakai
+    jika kolom asli tidak ada."""
+    columns = []
+    for key, renamed in (("col_lat_saved", "Latitude"), ("col_lon_saved", "Longitude"),
+                         ("name_column_saved", "NamaTitik")):
+        col = settings.get(key)
+        if col not in df.columns:
+            col = renamed if renamed in df.columns else None
+        if col is None:
+            raise ValueError(f"Kolom untuk {renamed} tidak ditemukan (settings '{key}' = {settings.get(key)!r}).")
+        columns.append(col)
+    return columns
+
+
+def build_map(df_map, map_colors, settings, nearest=None):
+    """folium.Map lengkap (radius, marker, legenda) seperti peta di app.py.
+    Cluster server (viewport) butuh Streamlit, jadi HTML statis selalu
+    memakai marker biasa / mode massal. Mode kepadatan dihitung sekali
+    pada zoom awal peta (6) untuk semua titik."""
+    layers, radius_details, radius_summary = radius_layers(
+        df_map, map_colors, settings.get("radius", {}), union=settings.get("radius_union", False)
+    )
+    weight_column = settings.get("density_weight", NO_WEIGHT)
+    weight_label = weight_column if weight_column in df_map.columns else None
+    if settings.get("density_mode"):
+        layers.append(density_layer(
+            df_map["Latitude"], df_map["Longitude"], 6, weights=density_weights(df_map, weight_column),
+            shape=settings.get("density_shape", "hex"), cell_px=int(settings.get("density_cell_px", 30)),
+            weight_label=weight_label,
+        ))
+    else:
+        popups = nearest_popups(df_map, nearest, settings.get("nearest_targets", [])) if nearest is not None else None
+        layers.append(marker_layer(
+            df_map, icon_colors(map_colors),
+            enable_cluster=settings.get("enable_cluster", False),
+            bulk_threshold=int(settings.get("bulk_marker_threshold", 5000)),
+            popups=popups,
+        ))
+
+    if settings.get("draw_shapes"):
+        # area filter dari peta interaktif ikut ditampilkan
+        layers.append(drawn_items_group(settings["draw_shapes"]))
+
+    m = folium.Map(location=map_center(df_map), zoom_start=6)
+    for layer in layers:
+        layer.add_to(m)
+    if settings.get("density_mode"):
+        legend = density_legend_html(settings.get("density_shape", "hex"), weight_label)
+    else:
+        legend = legend_html(
+            df_map, map_colors, settings.get("legend_column", NO_LEGEND),
+            sort=settings.get("legend_sort", "alpha"), show_counts=settings.get("legend_show_counts", True),
+        )
+    if legend:
+        m.get_root().html.add_child(folium.Element(legend))
+    return m, radius_details, radius_summary
+
+
+def render_job(progress_path, out_dir, excel_path=None, export_format="Excel", html=True,
+               tiles_dir=None, tile_zooms=(0, 12)):
+    """Satu file progress -> <nama>.html + <nama>.<ext> (+ pyramid tile di
+    tiles_dir/<nama>/ jika tiles_dir diisi). Return ringkasan job."""
+    started = time.perf_counter()
+    progress_path = Path(progress_path)
+    result = {"progress": str(progress_path), "outputs": [], "error": None}
+    try:
+        settings, df = load_progress(progress_path.read_bytes())
+        if excel_path:
+            df = _load_dataset(excel_path)
+        col_lat, col_lon, name_column = _main_columns(df, settings)
+        df, mask_valid = sanitize_coordinates(df, col_lat, col_lon, name_column)
+
+        row_mask = apply_saved_filters(df, FilterIndex(len(df), normalize_display_values), settings)
+        warna_column = settings.get("warna_column_saved")
+        custom_colors = {str(k): v for k, v in settings.get("kcp_custom_colors", {}).items()}
+        marker_colors = resolve_marker_colors(
+            df.loc[row_mask, color_columns(df, warna_column)], warna_column, custom_colors
+        )
+        df_map = map_frame(
+            df, row_mask, mask_valid,
+            extra_columns=[settings.get("legend_column"), settings.get("density_weight")],
+        )
+        map_colors = marker_colors[mask_valid.to_numpy()[row_mask]]
+
+        nearest = nearest_enrichment(df, mask_valid, settings)
+        m, radius_details, _ = build_map(df_map, map_colors, settings, nearest)
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        if html:
+            html_path = out_dir / f"{progress_path.stem}.html"
+            m.save(str(html_path))
+            result["outputs"].append(str(html_path))
+        if export_format:
+            ext, _ = EXPORT_FORMATS[export_format]
+            export_path = out_dir / f"{progress_path.stem}.{ext}"
+            df_export = export_frame(df, row_mask, marker_colors, radius_details, nearest)
+            export_path.write_bytes(export_bytes(df_export, export_format))
+            result["outputs"].append(str(export_path))
+        if tiles_dir:
+            # titik hasil filter dengan warna marker akhir, dibakar ke tile PNG
+            tile_path = Path(tiles_dir) / progress_path.stem
+            render_pyramid(
+                df_map["Latitude"].to_numpy(dtype=float), df_map["Longitude"].to_numpy(dtype=float),
+                icon_colors(map_colors), tile_path, min_zoom=tile_zooms[0], max_zoom=tile_zooms[1],
+            )
+            result["outputs"].append(str(tile_path))
+        result.update(rows=int(row_mask.sum()), points=int(len(df_map)))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _expand(patterns):
+    """Path / glob (untuk shell yang tidak mengekspansi glob, mis. Windows)."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(Path().glob(pattern)) if any(c in pattern for c in "*?[") else [Path(pattern)]
+        paths.extend(matches)
+    return list(dict.fromkeys(paths))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render peta HTML & export data dari file progress (tanpa UI).")
+    parser.add_argument("progress", nargs="+", help="file progress JSON/ZIP (boleh glob)")
+    parser.add_argument("--excel", help="file Excel sumber data; default data di dalam file progress")
+    parser.add_argument("--out", default="batch_output", help="folder output (default: batch_output)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="jumlah proses paralel")
+    parser.add_argument("--export-format", choices=list(EXPORT_FORMATS) + ["none"], default="Excel",
+                        help="format export data (default: Excel)")
+    parser.add_argument("--no-html", action="store_true", help="jangan render peta HTML")
+    parser.add_argument("--tiles", help="folder pyramid tile PNG (mis. static/tiles), satu sub-folder per progress")
+    parser.add_argument("--tile-min-zoom", type=int, default=0, help="zoom terendah pyramid tile (default: 0)")
+    parser.add_argument("--tile-max-zoom", type=int, default=12, help="zoom tertinggi pyramid tile (default: 12)")
+    args = parser.parse_args(argv)
+    if not 0 <= args.tile_min_zoom <= args.tile_max_zoom <= 18:
+        parser.error("zoom tile harus 0 <= --tile-min-zoom <= --tile-max-zoom <= 18")
+
+    progress_files = _expand(args.progress)
+    missing = [str(p) for p in progress_files if not p.is_file()]
+    if missing:
+        parser.error(f"file progress tidak ditemukan: {', '.join(missing)}")
+    stems = [p.stem for p in progress_files]
+    duplicates = sorted({s for s in stems if stems.count(s) > 1})
+    if duplicates:
+        parser.error(f"nama file progress ganda (output akan saling menimpa): {', '.join(duplicates)}")
+
+    excel_path = str(Path(args.excel).resolve()) if args.excel else None
+    if excel_path:
+        # parse Excel sekali di proses utama agar semua worker kena cache disk
+        _load_dataset(excel_path)
+    job_kwargs = {
+        "out_dir": args.out,
+        "excel_path": excel_path,
+        "export_format": None if args.export_format == "none" else args.export_format,
+        "html": not args.no_html,
+        "tiles_dir": args.tiles,
+        "tile_zooms": (args.tile_min_zoom, args.tile_max_zoom),
+    }
+
+    results = []
+    workers = max(1, min(args.workers, len(progress_files)))
+    if workers == 1:
+        results = [render_job(p, **job_kwargs) for p in progress_files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_job, p, **job_kwargs) for p in progress_files]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    failed = 0
+    for r in sorted(results, key=lambda r: r["progress"]):
+        if r["error"]:
+            failed += 1
+            print(f"GAGAL  {r['progress']}: {r['error']}", file=sys.stderr)
+        else:
+            print(f"OK     {r['progress']} ({r['points']}/{r['rows']} titik, {r['seconds']} s)")
+    print(f"{len(results) - failed} berhasil, {failed} gagal")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Benchmark tiap tahap pipeline app.py dengan data sintetis.
+
+Tahap yang diukur (per ukuran data):
+    load_data_cold / load_data_warm, sanitize, filters, colors, legend,
+    map_build (+ ukuran HTML), save_json / save_zip, export_excel
+
+Contoh:
+    python benchmarks/bench_pipeline.py --sizes 1000,10000,100000 --output bench.json
+    python benchmarks/bench_pipeline.py --sizes 1000000 --stages sanitize,filters,colors
+    python benchmarks/bench_pipeline.py --baseline bench_lama.json   # exit 1 jika ada regresi
+
+Hasil ditulis sebagai JSON (satu record per ukuran x tahap).
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ingest_cache  # noqa: E402
+from batch_render import build_map  # noqa: E402
+from export_io import export_bytes, export_excel  # noqa: E402
+from filter_index import FilterIndex  # noqa: E402
+from map_core import (  # noqa: E402
+    apply_saved_filters, color_columns, export_frame, legend_html, map_frame, normalize_display_values,
+    resolve_marker_colors, sanitize_coordinates,
+)
+from progress_io import dump_progress_json, dump_progress_zip  # noqa: E402
+
+STAGES = [
+    "load_data_cold", "load_data_warm", "sanitize", "filters", "colors",
+    "legend", "map_build", "save_json", "save_zip", "export_excel",
+]
+
+PROPINSI = ["DKI Jakarta", "Jawa Barat", "Jawa Tengah", "Jawa Timur", "Banten", "Bali",
+            "Sumatera Utara", "Sumatera Barat", "Riau", "Lampung", "Kalimantan Timur", "Sulawesi Selatan"]
+WARNA = ["red", "blue", "green", "purple", "orange", "darkblue", "Red ", "purpel", "", None]
+
+
+def make_dataset(n, seed=0):
+    """Data sintetis mirip sheet asli: kolom campur tipe (1, 1.0, "1"),
+    koordinat dengan koma desimal, koordinat rusak & warna kosong/typo."""
+    rng = np.random.default_rng(seed)
+    prov = rng.integers(0, len(PROPINSI), n)
+    kota_num = rng.integers(1, 40, n)
+    kota = np.where(rng.random(n) < 0.5, kota_num.astype(object), kota_num.astype(float).astype(object))
+    kota = np.where(rng.random(n) < 0.2, [f"Kota {k}" for k in kota_num], kota)
+    lat = rng.uniform(-10.5, 5.5, n).round(6)
+    lon = rng.uniform(95.0, 141.0, n).round(6)
+    lat_col = lat.astype(object)
+    comma = rng.random(n) < 0.05
+    lat_col[comma] = [f"{v}".replace(".", ",") for v in lat[comma]]
+    lat_col[rng.random(n) < 0.01] = "n/a"
+    return pd.DataFrame({
+        "Nama KCP": [f"KCP {i:07d}" for i in range(n)],
+        "Lat": lat_col,
+        "Lon": lon,
+        "Propinsi": np.array(PROPINSI, dtype=object)[prov],
+        "Kota": kota,
+        "Kanwil": rng.integers(1, 13, n),
+        "Warna": np.array(WARNA, dtype=object)[rng.integers(0, len(WARNA), n)],
+        "Zona": rng.choice(["Barat", "Tengah", "Timur"], n),
+        "Kode Unit": rng.integers(10_000, 99_999, n).astype(str),
+    })
+
+
+SETTINGS = {
+    "col_lat_saved": "Lat",
+    "col_lon_saved": "Lon",
+    "name_column_saved": "Nama KCP",
+    "warna_column_saved": "Kota",
+    "kcp_custom_colors": {"1": "darkred", "2": "cadetblue", "Kota 3": "black"},
+    "legend_column": "Propinsi",
+    "enable_cluster": True,
+    "bulk_marker_threshold": 5000,
+    "filter_selections": {"Propinsi": PROPINSI[:8], "Kota": ["Pilih Semua"], "Kanwil": ["Pilih Semua"]},
+    "additional_filter_cols_saved": ["Zona"],
+    "additional_filter_values": {"Zona": ["Barat", "Tengah"]},
+    "radius": {},
+}
+
+
+def _timed(fn, repeat):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def run_size(n, stages, repeat, workdir):
+    """Jalankan semua tahap untuk n baris. Return list record hasil."""
+    records = []
+
+    def record(stage, fn, bytes_of=None):
+        result, times = _timed(fn, repeat)
+        rec = {
+            "rows": n,
+            "stage": stage,
+            "seconds_min": round(min(times), 6),
+            "seconds_median": round(statistics.median(times), 6),
+            "repeat": repeat,
+        }
+        if bytes_of is not None:
+            rec["bytes"] = int(bytes_of(result))
+        records.append(rec)
+        print(f"{n:>9} {stage:<16} {rec['seconds_min']:>9.3f} s" + (f" {rec['bytes']:>12} B" if "bytes" in rec else ""))
+        return result
+
+    raw = make_dataset(n)
+    xlsx = export_excel(raw)
+    ingest_cache.CACHE_DIR = Path(workdir) / f"cache_{n}"
+    key = ingest_cache.content_hash(xlsx)
+
+    def load_cold():
+        for path in ingest_cache._cache_files(key):
+            path.unlink(missing_ok=True)
+        return ingest_cache.load_excel_cached(xlsx, key=key)
+
+    df = load_cold()
+    if "load_data_cold" in stages:
+        df = record("load_data_cold", load_cold)
+    if "load_data_warm" in stages:
+        df = record("load_data_warm", lambda: ingest_cache.load_excel_cached(xlsx, key=key))
+
+    sanitize = lambda: sanitize_coordinates(df, "Lat", "Lon", "Nama KCP")  # noqa: E731
+    df_s, mask_valid = record("sanitize", sanitize) if "sanitize" in stages else sanitize()
+
+    # index baru tiap ulangan: mengukur biaya rerun pertama setelah upload
+    filters = lambda: apply_saved_filters(df_s, FilterIndex(len(df_s), normalize_display_values), SETTINGS)  # noqa: E731
+    row_mask = record("filters", filters) if "filters" in stages else filters()
+
+    warna_column = SETTINGS["warna_column_saved"]
+    colors = lambda: resolve_marker_colors(  # noqa: E731
+        df_s.loc[row_mask, color_columns(df_s, warna_column)], warna_column, SETTINGS["kcp_custom_colors"]
+    )
+    marker_colors = record("colors", colors) if "colors" in stages else colors()
+    df_map = map_frame(df_s, row_mask, mask_valid, extra_columns=[SETTINGS["legend_column"]])
+    map_colors = marker_colors[mask_valid.to_numpy()[row_mask]]
+
+    if "legend" in stages:
+        record("legend", lambda: legend_html(df_map, map_colors, SETTINGS["legend_column"]))
+    if "map_build" in stages:
+        def map_build():
+            m, _, _ = build_map(df_map, map_colors, SETTINGS)
+            return m.get_root().render()
+        record("map_build", map_build, bytes_of=lambda html: len(html.encode("utf-8")))
+    if "save_json" in stages:
+        record("save_json", lambda: dump_progress_json(df_s, SETTINGS), bytes_of=len)
+    if "save_zip" in stages:
+        record("save_zip", lambda: dump_progress_zip(df_s, SETTINGS), bytes_of=len)
+    if "export_excel" in stages:
+        df_export = export_frame(df_s, row_mask, marker_colors, {})
+        record("export_excel", lambda: export_bytes(df_export, "Excel"), bytes_of=len)
+    return records
+
+
+def compare(results, baseline_path, tolerance):
+    """Bandingkan dengan hasil sebelumnya; return daftar tahap yang melambat."""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    old = {(r["rows"], r["stage"]): r["seconds_min"] for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        before = old.get((r["rows"], r["stage"]))
+        # tahap sangat cepat (< 10 ms) terlalu berisik untuk dibandingkan
+        if before and max(before, r["seconds_min"]) >= 0.01 and r["seconds_min"] > before * (1 + tolerance):
+            regressions.append({**r, "baseline_seconds_min": before})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tahap pipeline dengan data sintetis.")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="jumlah baris, pisahkan dengan koma (mis. 1000,10000,100000,1000000)")
+    parser.add_argument("--stages", default=",".join(STAGES), help="tahap yang diukur")
+    parser.add_argument("--repeat", type=int, default=1, help="ulangan per tahap (dilaporkan min & median)")
+    parser.add_argument("--output", default="benchmark_results.json", help="file hasil JSON")
+    parser.add_argument("--baseline", help="hasil sebelumnya untuk deteksi regresi")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="batas perlambatan relatif terhadap baseline (default 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = sorted(set(stages) - set(STAGES))
+    if unknown:
+        parser.error(f"tahap tidak dikenal: {', '.join(unknown)} (pilihan: {', '.join(STAGES)})")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            results.extend(run_size(n, stages, max(1, args.repeat), workdir))
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+    exit_code = 0
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        output["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESI {r['rows']} {r['stage']}: {r['baseline_seconds_min']:.3f} s -> {r['seconds_min']:.3f} s")
+        exit_code = 1 if regressions else 0
+    Path(args.output).write_text(json.dumps(output, indent=2), encoding="utf-8")
+    print(f"hasil ditulis ke {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
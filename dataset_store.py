@@ -0,0 +1,111 @@
+import os
+import threading
+from collections import OrderedDict
+
+from instrumentation import approx_nbytes
+
+# Batas memori store bersama (semua sesi dalam satu proses Streamlit)
+STORE_MAX_MB = float(os.environ.get("MAP_STORE_MAX_MB", "1024"))
+
+
+class DatasetStore:
+    """Store objek bersama antar sesi, dialamatkan dengan kunci isi (hash).
+
+    Sesi hanya menyimpan kunci; DataFrame dataset, frame hasil sanitasi,
+    index filter, payload peta & file unduhan disimpan sekali di sini
+    walaupun dibuka banyak sesi. Isi store dianggap immutable: jangan ubah
+    objek hasil get() secara in-place, kecuali index yang melengkapi dirinya
+    sendiri saat dipakai (FilterIndex): pengisian itu dijaga lock milik
+    objek dan tambahan ukurannya dilaporkan lewat grow(). Jika total ukuran
+    melebihi max_mb, entri yang paling lama tidak dipakai dibuang (LRU);
+    pemanggil cukup membangun ulang (get_or_load) saat entri sudah tidak
+    ada.
+    """
+
+    def __init__(self, max_mb=None):
+        self.max_bytes = (STORE_MAX_MB if max_mb is None else max_mb) * 2**20
+        self._entries = OrderedDict()  # key -> (obj, nbytes)
+        self._total = 0
+        self._lock = threading.RLock()
+        self._loading = {}  # key -> Lock, agar satu dataset tidak dimuat ganda
+        self.hits = self.misses = self.evictions = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, obj, nbytes=None):
+        nbytes = approx_nbytes(obj) if nbytes is None else nbytes
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            self._entries[key] = (obj, nbytes)
+            self._total += nbytes
+            self._evict(keep=key)
+        return obj
+
+    def grow(self, key, nbytes, obj=None):
+        """Tambah ukuran tercatat entri key (objek yang tumbuh setelah put);
+        diabaikan jika entri sudah dibuang / diganti objek lain."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (obj is not None and entry[0] is not obj):
+                return
+            self._entries[key] = (entry[0], entry[1] + nbytes)
+            self._total += nbytes
+            self._evict(keep=key)
+
+    def get_or_load(self, key, loader):
+        """Ambil dari store; jika tidak ada panggil loader() sekali (sesi
+        lain yang meminta kunci sama menunggu hasilnya). Hasil None tidak
+        disimpan."""
+        obj = self.get(key)
+        if obj is not None:
+            return obj
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            obj = self.get(key)
+            if obj is None:
+                obj = loader()
+                if obj is not None:
+                    self.put(key, obj)
+        with self._lock:
+            self._loading.pop(key, None)
+        return obj
+
+    def _evict(self, keep=None):
+        # urutan OrderedDict = urutan pemakaian terakhir (paling lama di depan)
+        for key in list(self._entries):
+            if self._total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            _, nbytes = self._entries.pop(key)
+            self._total -= nbytes
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_mb": round(self._total / 2**20, 2),
+                "max_mb": round(self.max_bytes / 2**20, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,136 @@
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import compact_dtypes, content_hash, normalize_columns, read_excel_fast
+from map_core import coordinate_mask, display_keys, sanitize_coordinates
+
+# Kolom opsional di file delta: nilai "hapus"/"delete" -> baris dengan ID itu
+# dihapus; selain itu baris di-update (ID sudah ada) atau ditambahkan (ID baru).
+DELTA_ACTION_COLUMN = "Aksi"
+DELETE_ACTIONS = {"hapus", "delete", "del", "d"}
+
+
+def read_delta(data: bytes, file_name="") -> pd.DataFrame:
+    """File delta Excel atau CSV, nama kolom dinormalisasi seperti dataset."""
+    if str(file_name).lower().endswith(".csv"):
+        df = pd.read_csv(BytesIO(data), sep=None, engine="python")
+    else:
+        df = read_excel_fast(data)
+    return normalize_columns(df)
+
+
+def delta_key(base_key, delta_hash, id_column):
+    """Kunci dataset hasil delta: turunan dari kunci dataset dasar."""
+    return "delta-" + content_hash(f"{base_key}\t{delta_hash}\t{id_column}".encode("utf-8"))
+
+
+def _restore_dtype(values, original):
+    """Kolom yang diubah (object) -> kembali numerik jika aslinya numerik."""
+    s = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(original) and not pd.api.types.is_bool_dtype(original):
+        converted = pd.to_numeric(s, errors="coerce")
+        if converted.notna().sum() == s.notna().sum():
+            return converted
+    return s
+
+
+def apply_delta(df, delta, id_column):
+    """Terapkan delta (insert / update / delete berdasarkan id_column).
+
+    ID dicocokkan lewat display-key (1, 1.0 & "1" dianggap sama). Sel
+    kosong di delta tidak mengubah nilai lama. Return (df_baru, info):
+    baris df_baru = baris lama yang tidak dihapus (urutan tetap, posisi
+    lama di info["kept_old"]) lalu baris baru; info["changed"] = posisi
+    baris yang diubah / ditambahkan di df_baru.
+    """
+    if id_column not in df.columns:
+        raise ValueError(f"Kolom ID '{id_column}' tidak ada di dataset.")
+    if id_column not in delta.columns:
+        raise ValueError(f"Kolom ID '{id_column}' tidak ada di file delta.")
+
+    delta_ids = display_keys(delta[id_column])
+    delta = delta[delta_ids.notna().to_numpy()].reset_index(drop=True)
+    delta_ids = delta_ids.dropna().reset_index(drop=True)
+    duplicated = delta_ids[delta_ids.duplicated()].unique().tolist()
+    if duplicated:
+        raise ValueError(f"ID ganda di file delta: {', '.join(map(str, duplicated[:10]))}")
+
+    if DELTA_ACTION_COLUMN in delta.columns:
+        action = delta[DELTA_ACTION_COLUMN].astype(str).str.strip().str.lower()
+        is_delete = action.isin(DELETE_ACTIONS).to_numpy()
+        delta = delta.drop(columns=[DELTA_ACTION_COLUMN])
+    else:
+        is_delete = np.zeros(len(delta), dtype=bool)
+
+    base_ids = display_keys(df[id_column])
+    delete_rows = base_ids.isin(set(delta_ids[is_delete])).to_numpy()
+    upsert_ids = pd.Index(delta_ids[~is_delete])
+    upsert_rows = np.flatnonzero(~is_delete)
+    # baris delta (index upsert) untuk tiap baris lama; -1 jika tidak di-update
+    match = upsert_ids.get_indexer(base_ids)
+    match[delete_rows] = -1
+
+    kept_old = np.flatnonzero(~delete_rows)
+    new_pos = np.cumsum(~delete_rows) - 1
+    updated_old = np.flatnonzero(match >= 0)
+    updated_new = new_pos[updated_old]
+    source = upsert_rows[match[updated_old]]
+    insert_rows = upsert_rows[~upsert_ids.isin(base_ids)]
+
+    out = df.iloc[kept_old].reset_index(drop=True)
+    columns = [c for c in delta.columns if c != id_column]
+    for col in columns:
+        values = delta[col].to_numpy(dtype=object)[source]
+        present = pd.notna(values)
+        if not present.any():
+            continue
+        original = df[col].dtype if col in df.columns else np.dtype(object)
+        arr = out[col].to_numpy(dtype=object, copy=True) if col in out.columns else np.full(len(out), np.nan, dtype=object)
+        arr[updated_new[present]] = values[present]
+        out[col] = _restore_dtype(arr, original).to_numpy()
+
+    if len(insert_rows):
+        inserts = delta.iloc[insert_rows].reset_index(drop=True)
+        out = pd.concat([out, inserts], ignore_index=True)
+    # hanya kolom yang tipenya berubah (object / campur) yang diringkas ulang
+    touched = [c for c in out.columns if c not in df.columns or out[c].dtype != df[c].dtype]
+    for col, values in compact_dtypes(out[touched].copy()).items():
+        out[col] = values
+
+    changed = np.concatenate([updated_new, np.arange(len(kept_old), len(out))]).astype(np.int64)
+    info = {
+        "kept_old": kept_old,
+        "changed": changed,
+        # kolom lama yang tipenya berubah (mis. float -> teks karena delta)
+        "retyped": [c for c in df.columns if c in out.columns and out[c].dtype != df[c].dtype],
+        "inserted": int(len(insert_rows)),
+        "updated": int(len(updated_old)),
+        "deleted": int(delete_rows.sum()),
+        "not_found": int(is_delete.sum()) - int(pd.Index(delta_ids[is_delete]).isin(base_ids).sum()),
+    }
+    return out, info
+
+
+def update_prepared(prepared, df_new, info, col_lat, col_lon, name_column):
+    """Versi inkremental sanitize_coordinates untuk dataset hasil delta:
+    koordinat baris lama diambil dari hasil sebelumnya, hanya baris yang
+    berubah yang disanitasi ulang. Hasil (nilai & dtype) sama dengan
+    sanitize_coordinates atas df_new. Jika tipe kolom koordinat berubah
+    karena delta, konversinya lewat jalur lain (mis. float -> teks), jadi
+    semua baris dihitung ulang."""
+    if {col_lat, col_lon} & set(info.get("retyped", [col_lat, col_lon])):
+        return sanitize_coordinates(df_new, col_lat, col_lon, name_column)
+    df = df_new.rename(columns={col_lat: "Latitude", col_lon: "Longitude", name_column: "NamaTitik"})
+    prev, _ = prepared
+    kept_old, changed = info["kept_old"], info["changed"]
+    fresh, _ = sanitize_coordinates(df_new.iloc[changed], col_lat, col_lon, name_column)
+    for col in ("Latitude", "Longitude"):
+        # dtype hasil penuh: int64 jika semua int, float64 jika ada desimal / NaN
+        dtype = np.result_type(prev[col].dtype, fresh[col].dtype) if len(changed) else prev[col].dtype
+        values = np.empty(len(df), dtype=dtype)
+        values[:len(kept_old)] = prev[col].to_numpy()[kept_old]
+        values[changed] = fresh[col].to_numpy()
+        df[col] = values
+    return df, coordinate_mask(df)
@@ -0,0 +1,184 @@
+import folium
+import numpy as np
+import pandas as pd
+from folium import plugins
+
+from viewport_cluster import _bounds_mask, _mercator
+
+# bentuk tampilan kepadatan -> label di sidebar
+DENSITY_SHAPES = {"hex": "Hexbin", "square": "Grid Kotak", "heatmap": "Heatmap"}
+# skala warna sedikit -> banyak (YlOrRd)
+DENSITY_PALETTE = ["#ffffb2", "#fed976", "#feb24c", "#fd8d3c", "#f03b20", "#bd0026"]
+NO_WEIGHT = "(Tidak ada)"
+
+_SQRT3 = np.sqrt(3.0)
+
+
+def density_weights(data, weight_column):
+    """Bobot numerik per titik (nilai kosong/teks -> 0); None jika tanpa bobot."""
+    if not weight_column or weight_column == NO_WEIGHT or weight_column not in data.columns:
+        return None
+    values = data[weight_column]
+    if not pd.api.types.is_numeric_dtype(values.dtype):
+        values = values.astype(str).str.replace(",", ".", regex=False)
+    return pd.to_numeric(values, errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+
+def _unproject(px, py, world_px):
+    """Piksel mercator pada zoom tertentu -> (lat, lon)."""
+    lon = px / world_px * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * py / world_px))))
+    return lat, lon
+
+
+def _hex_cells(px, py, radius):
+    """Sel hexagon (pointy-top, baris ganjil bergeser) untuk tiap titik,
+    seperti d3-hexbin tetapi tervektorisasi & jarak dibandingkan dalam piksel."""
+    dx, dy = radius * _SQRT3, radius * 1.5
+    fy = py / dy
+    row = np.round(fy)
+    odd = (row.astype(np.int64) & 1).astype(float)
+    fx = px / dx - odd / 2
+    col = np.round(fx)
+    off_y = fy - row
+    # dekat batas atas/bawah: bandingkan dengan hexagon tetangga
+    edge = np.abs(off_y) * 3 > 1
+    col2 = col + np.where(fx < col, -0.5, 0.5)
+    row2 = row + np.where(fy < row, -1.0, 1.0)
+    d1 = ((fx - col) * dx) ** 2 + (off_y * dy) ** 2
+    d2 = ((fx - col2) * dx) ** 2 + ((fy - row2) * dy) ** 2
+    use2 = edge & (d1 > d2)
+    col = np.where(use2, col2 + np.where(odd == 1, 0.5, -0.5), col)
+    row = np.where(use2, row2, row)
+    return col.astype(np.int64), row.astype(np.int64)
+
+
+def bin_points(lat, lon, zoom, weights=None, shape="hex", cell_px=30, tile_size=256):
+    """Kelompokkan titik ke sel hexagon / kotak berukuran ~cell_px piksel
+    layar pada zoom ini. Return DataFrame [lat, lon, count, value, polygon]
+    per sel berisi titik; value = jumlah bobot (atau jumlah titik)."""
+    world_px = tile_size * 2.0 ** zoom
+    x, y = _mercator(lat, lon)
+    px, py = x * world_px, y * world_px
+    if shape == "hex":
+        radius = cell_px / 2.0
+        col, row = _hex_cells(px, py, radius)
+    else:
+        col, row = np.floor(px / cell_px).astype(np.int64), np.floor(py / cell_px).astype(np.int64)
+
+    keys, inverse = np.unique((col << 32) | (row & 0xFFFFFFFF), return_inverse=True)
+    count = np.bincount(inverse, minlength=len(keys))
+    value = count.astype(float) if weights is None else np.bincount(inverse, weights=weights, minlength=len(keys))
+    col, row = keys >> 32, (keys & 0xFFFFFFFF).astype(np.int64)
+    row = np.where(row >= 2**31, row - 2**32, row)
+
+    if shape == "hex":
+        cx = (col + (row & 1) / 2.0) * radius * _SQRT3
+        cy = row * radius * 1.5
+        angles = np.arange(6) * np.pi / 3
+        vx = cx[:, None] + np.sin(angles) * radius
+        vy = cy[:, None] - np.cos(angles) * radius
+    else:
+        cx, cy = (col + 0.5) * cell_px, (row + 0.5) * cell_px
+        vx = (col[:, None] + np.array([0, 1, 1, 0])) * float(cell_px)
+        vy = (row[:, None] + np.array([0, 0, 1, 1])) * float(cell_px)
+    c_lat, c_lon = _unproject(cx, cy, world_px)
+    v_lat, v_lon = _unproject(vx, vy, world_px)
+    return pd.DataFrame({
+        "lat": c_lat,
+        "lon": c_lon,
+        "count": count,
+        "value": value,
+        "polygon": list(np.stack([v_lon, v_lat], axis=-1).round(6)),
+    })
+
+
+def density_colors(value):
+    """Warna palette per sel, skala log relatif terhadap nilai terbesar."""
+    value = np.clip(np.asarray(value, dtype=float), 0, None)
+    top = value.max() if len(value) else 0.0
+    if top <= 0:
+        return np.full(len(value), DENSITY_PALETTE[0], dtype=object)
+    level = np.log1p(value) / np.log1p(top) * (len(DENSITY_PALETTE) - 1)
+    return np.asarray(DENSITY_PALETTE, dtype=object)[np.round(level).astype(int)]
+
+
+def _format_value(v):
+    return f"{v:,.0f}" if float(v).is_integer() else f"{v:,.2f}"
+
+
+def density_layer(lat, lon, zoom, weights=None, shape="hex", cell_px=30, bounds=None,
+                  weight_label=None, pad=0.1):
+    """Satu FeatureGroup ringan berisi sel kepadatan di viewport: GeoJSON
+    poligon (hex/kotak) atau satu HeatMap dari pusat sel, bukan satu
+    Marker per titik. bounds = (south, west, north, east) atau None (semua)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if bounds is not None:
+        south, west, north, east = bounds
+        dlat, dlon = (north - south) * pad, (east - west) * pad
+        visible = _bounds_mask(lat, lon, (south - dlat, west - dlon, north + dlat, east + dlon))
+        lat, lon = lat[visible], lon[visible]
+        weights = None if weights is None else np.asarray(weights)[visible]
+    zoom = int(min(max(round(zoom), 0), 20))
+
+    group = folium.FeatureGroup(name="Kepadatan")
+    if not len(lat):
+        return group
+    if shape == "heatmap":
+        # sel kecil: heatmap tetap halus, payload sebanyak sel bukan titik
+        cells = bin_points(lat, lon, zoom, weights, shape="square", cell_px=max(4, cell_px // 4))
+        intensity = np.clip(cells["value"].to_numpy(), 0, None)
+        top = intensity.max()
+        intensity = intensity / top if top > 0 else intensity
+        plugins.HeatMap(
+            np.column_stack([cells["lat"], cells["lon"], intensity]).round(6).tolist(),
+            name="Kepadatan", radius=max(10, cell_px // 2), blur=max(8, cell_px // 3), min_opacity=0.3,
+            # intensitas sudah dinormalisasi untuk zoom ini; tanpa redaman leaflet-heat
+            max_zoom=zoom,
+        ).add_to(group)
+        return group
+
+    cells = bin_points(lat, lon, zoom, weights, shape=shape, cell_px=cell_px)
+    colors = density_colors(cells["value"])
+    features = []
+    for polygon, count, value, color in zip(cells["polygon"], cells["count"], cells["value"], colors):
+        ring = polygon.tolist()
+        info = f"{int(count):,} titik"
+        if weight_label:
+            info += f"<br>{weight_label}: {_format_value(value)}"
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring + ring[:1]]},
+            "properties": {"color": color, "info": info},
+        })
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        style_function=lambda f: {
+            "fillColor": f["properties"]["color"], "color": "#555555",
+            "weight": 0.5, "fillOpacity": 0.65,
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["info"], labels=False),
+    ).add_to(group)
+    return group
+
+
+def density_legend_html(shape, weight_label=None):
+    """Legenda skala warna kepadatan (nilai persis ada di tooltip sel)."""
+    title = f"Kepadatan ({DENSITY_SHAPES.get(shape, shape)})"
+    subtitle = f"Bobot: {weight_label}" if weight_label else "Jumlah titik per sel"
+    if shape == "heatmap":
+        swatches = "background:linear-gradient(to right,blue,cyan,lime,yellow,red);"
+    else:
+        swatches = f"background:linear-gradient(to right,{','.join(DENSITY_PALETTE)});"
+    return f"""
+    <div style="position:absolute; bottom:10px; right:10px; z-index:9999; background-color:white;
+        padding:10px; border:2px solid #ccc; border-radius:8px; box-shadow:2px 2px 5px rgba(0,0,0,0.3);
+        font-size:14px; max-width:220px;">
+        <b>{title}</b><br><span style="color:#666; font-size:12px;">{subtitle}</span>
+        <div style="{swatches} width:180px; height:12px; margin:6px 0 2px 0;"></div>
+        <div style="display:flex; justify-content:space-between; width:180px; color:#666; font-size:12px;">
+            <span>sedikit</span><span>banyak</span>
+        </div>
+    </div>
+    """
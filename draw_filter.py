@@ -0,0 +1,106 @@
+import hashlib
+import json
+
+import folium
+import numpy as np
+
+# shapely (GEOS) opsional: tanpa shapely dipakai uji ray casting numpy
+try:
+    import shapely
+    if not hasattr(shapely, "contains_xy"):  # shapely < 2
+        raise ImportError
+except ImportError:
+    shapely = None
+
+# batas elemen matriks titik x sisi per batch pada fallback numpy
+_MAX_PAIRS = 4_000_000
+
+
+def normalize_drawings(features):
+    """Fitur GeoJSON dari st_folium (all_drawings) -> list poligon
+    [[ring luar, lubang...]] dengan koordinat [lon, lat] 6 desimal (presisi
+    toGeoJSON Leaflet, jadi bentuk yang digambar ulang menghasilkan key
+    yang sama). Hanya Polygon/MultiPolygon (termasuk persegi) yang dipakai;
+    garis, marker & lingkaran (radius tidak ikut dikirim) diabaikan."""
+    shapes = []
+    for feature in features or []:
+        geometry = (feature or {}).get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry.get("coordinates") or []]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry.get("coordinates") or []
+        else:
+            continue
+        for rings in polygons:
+            rings = [
+                [[round(float(x), 6), round(float(y), 6)] for x, y, *_ in ring]
+                for ring in rings
+            ]
+            rings = [ring + ring[:1] if ring[0] != ring[-1] else ring for ring in rings if len(ring) >= 3]
+            if rings:
+                shapes.append(rings)
+    return shapes
+
+
+def shapes_key(shapes):
+    """Kunci isi bentuk (untuk cache & deteksi perubahan); "" jika kosong."""
+    if not shapes:
+        return ""
+    return hashlib.blake2b(json.dumps(shapes).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _in_rings_numpy(rings, x, y):
+    """Even-odd ray casting untuk semua ring sekaligus (lubang otomatis
+    terhitung), vectorized per batch titik x sisi."""
+    edges = np.concatenate([np.stack([r[:-1], r[1:]], axis=1) for r in rings])
+    x1, y1, x2, y2 = edges[:, 0, 0], edges[:, 0, 1], edges[:, 1, 0], edges[:, 1, 1]
+    inside = np.zeros(len(x), dtype=bool)
+    step = max(1, _MAX_PAIRS // len(edges))
+    for start in range(0, len(x), step):
+        px, py = x[start:start + step, None], y[start:start + step, None]
+        crosses = (y1 > py) != (y2 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (x2 - x1) * (py - y1) / (y2 - y1) + x1
+        inside[start:start + step] = (np.count_nonzero(crosses & (px < x_cross), axis=1) % 2) == 1
+    return inside
+
+
+def points_in_shapes(lat, lon, shapes):
+    """Mask titik yang berada di dalam salah satu bentuk. Tiap poligon:
+    prefilter bounding box (vectorized) lalu uji point-in-polygon hanya
+    untuk kandidat yang belum masuk bentuk lain. NaN -> di luar."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    mask = np.zeros(len(lat), dtype=bool)
+    for rings in shapes:
+        rings = [np.asarray(r, dtype=float) for r in rings]
+        west, south = rings[0].min(axis=0)
+        east, north = rings[0].max(axis=0)
+        candidates = np.flatnonzero(
+            ~mask & (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        )
+        if not len(candidates):
+            continue
+        x, y = lon[candidates], lat[candidates]
+        if shapely is not None:
+            polygon = shapely.make_valid(shapely.polygons(rings[0], holes=rings[1:] or None))
+            shapely.prepare(polygon)
+            # titik tepat di tepi ikut terpilih
+            inside = shapely.intersects_xy(polygon, x, y)
+        else:
+            inside = _in_rings_numpy(rings, x, y)
+        mask[candidates[inside]] = True
+    return mask
+
+
+def drawn_items_group(shapes):
+    """FeatureGroup untuk Draw(feature_group=...): bentuk tersimpan digambar
+    ulang sebagai item yang bisa dihapus, sehingga tetap ada (dan tetap
+    terkirim di all_drawings) saat peta dirender ulang."""
+    group = folium.FeatureGroup(name="Area Gambar")
+    for rings in shapes:
+        folium.GeoJson(
+            {"type": "Feature", "properties": {}, "geometry": {"type": "Polygon", "coordinates": rings}},
+            style_function=lambda _: {"color": "#3388ff", "weight": 3, "fillOpacity": 0.1, "dashArray": "6 4"},
+        ).add_to(group)
+    return group
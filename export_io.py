@@ -0,0 +1,125 @@
+import math
+from datetime import date, datetime, time, timedelta
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# format -> (ekstensi file, mime)
+EXPORT_FORMATS = {
+    "Excel": ("xlsx", EXCEL_MIME),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/octet-stream"),
+}
+
+# batas baris satu sheet Excel (termasuk header)
+EXCEL_MAX_ROWS = 1_048_576
+
+# jumlah baris yang dikonversi ke nilai Python sekaligus saat export Excel
+_EXCEL_CHUNK_ROWS = 20_000
+
+
+def _excel_value(v):
+    """Konversi nilai pandas/numpy ke tipe yang dimengerti xlsxwriter."""
+    if v is None or v is pd.NaT or v is pd.NA:
+        return None
+    if isinstance(v, (np.integer,)):
+        return int(v)
+    if isinstance(v, (np.floating, float)):
+        f = float(v)
+        return None if math.isnan(f) else f
+    if isinstance(v, (np.bool_,)):
+        return bool(v)
+    if isinstance(v, pd.Timestamp):
+        # excel tidak punya timezone
+        return v.tz_localize(None).to_pydatetime() if v.tzinfo else v.to_pydatetime()
+    if isinstance(v, (str, int, bool, datetime, date, time)):
+        return v
+    if isinstance(v, timedelta):
+        return int(v.total_seconds())
+    return str(v)
+
+
+def _excel_column(series):
+    """Satu kolom -> list nilai Python; tipe numerik dikonversi sekaligus."""
+    if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype):
+        if not series.hasnans:
+            return series.tolist()
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        out = values.tolist()
+        if np.isnan(values).any():
+            for i in np.flatnonzero(np.isnan(values)).tolist():
+                out[i] = None
+        return out
+    return [_excel_value(v) for v in series.tolist()]
+
+
+def export_excel(df) -> bytes:
+    """Tulis Excel baris per baris dengan xlsxwriter mode constant_memory:
+    memori tetap kecil berapapun jumlah barisnya. Fallback ke openpyxl.
+    ValueError jika data melebihi batas baris Excel."""
+    if len(df) + 1 > EXCEL_MAX_ROWS:
+        raise ValueError(
+            f"{len(df):,} baris melebihi batas Excel ({EXCEL_MAX_ROWS - 1:,} baris data); gunakan CSV atau Parquet."
+        )
+    try:
+        import xlsxwriter
+    except ImportError:
+        buffer = BytesIO()
+        df.to_excel(buffer, index=False, engine="openpyxl")
+        return buffer.getvalue()
+
+    buffer = BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {
+        "constant_memory": True,
+        "strings_to_numbers": False,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "nan_inf_to_errors": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    worksheet = workbook.add_worksheet()
+    bold = workbook.add_format({"bold": True})
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], bold)
+    # konversi per potongan baris: memori puncak tergantung ukuran potongan,
+    # bukan jumlah baris export
+    for start in range(0, len(df), _EXCEL_CHUNK_ROWS):
+        chunk = df.iloc[start:start + _EXCEL_CHUNK_ROWS]
+        columns = [_excel_column(chunk.iloc[:, j]) for j in range(chunk.shape[1])]
+        for r, row in enumerate(zip(*columns), start=start + 1):
+            if worksheet.write_row(r, 0, row) < 0:
+                # xlsxwriter tidak raise, hanya melewati baris yang gagal
+                raise ValueError(f"Gagal menulis baris {r} ke Excel.")
+    workbook.close()
+    return buffer.getvalue()
+
+
+def export_csv(df) -> bytes:
+    # utf-8-sig agar langsung terbaca benar di Excel
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+def export_parquet(df) -> bytes:
+    """Parquet; kolom campur tipe (1, "1", 1.0) diubah ke teks."""
+    buffer = BytesIO()
+    try:
+        df.to_parquet(buffer, index=False)
+    except (TypeError, ValueError):
+        # ArrowTypeError / ArrowInvalid untuk kolom object campur tipe
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+        buffer = BytesIO()
+        df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def export_bytes(df, fmt) -> bytes:
+    if fmt == "CSV":
+        return export_csv(df)
+    if fmt == "Parquet":
+        return export_parquet(df)
+    return export_excel(df)
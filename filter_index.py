@@ -0,0 +1,152 @@
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import approx_nbytes
+
+
+class ColumnIndex:
+    """Kode kategori untuk satu kolom + tabel display-key -> kode.
+
+    codes[i]        : kode nilai baris i (-1 untuk NaN)
+    code_key[c]     : id display-key untuk kode c (-1 jika tidak punya key)
+    keys[k]         : display-key ke-k
+    uniques[c]      : nilai asli untuk kode c (untuk update delta)
+    """
+
+    def __init__(self, series: pd.Series, display):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        self.codes = codes
+        self.uniques = uniques
+        self.keys = []
+        self.key_id = {}
+        self.code_key = np.zeros(0, dtype=np.int64)
+        self._add_keys(uniques, display)
+
+    def _add_keys(self, uniques, display):
+        """Tambahkan display-key untuk nilai unik baru (kode berikutnya);
+        display dipanggil sekali untuk semua nilai unik (vectorized)."""
+        raw_keys = list(display(uniques))
+        for k in raw_keys:
+            if k is not None and k not in self.key_id:
+                self.key_id[k] = len(self.keys)
+                self.keys.append(k)
+        self.code_key = np.append(self.code_key, np.array(
+            [self.key_id[k] if k is not None else -1 for k in raw_keys],
+            dtype=np.int64,
+        ))
+
+    def updated(self, series: pd.Series, kept_old, changed, display):
+        """ColumnIndex untuk dataset hasil delta: kode baris lama dipetakan
+        ulang (baris ke-i dataset baru = kept_old[i] lama), hanya baris
+        changed (diubah / baru) yang dicari / di-factorize ulang."""
+        new = object.__new__(ColumnIndex)
+        new.keys = list(self.keys)
+        new.key_id = dict(self.key_id)
+        new.code_key = self.code_key
+        codes = np.full(len(series), -1, dtype=np.int64)
+        codes[:len(kept_old)] = self.codes[kept_old]
+
+        values = series.iloc[changed]
+        uniques = pd.Index(self.uniques)
+        found = uniques.get_indexer(values) if len(uniques) else np.full(len(values), -1, dtype=np.int64)
+        unseen = (found < 0) & values.notna().to_numpy()
+        if unseen.any():
+            extra_codes, extra = pd.factorize(values[unseen])
+            found[unseen] = len(uniques) + extra_codes
+            uniques = uniques.append(pd.Index(extra))
+            new._add_keys(extra, display)
+        codes[changed] = found
+        new.codes = codes
+        new.uniques = uniques
+        return new
+
+    def present_keys(self, mask=None):
+        """Display-key yang muncul pada baris mask, terurut case-insensitive
+        (seri diurutkan menurut kemunculan pertama, seperti pd.unique)."""
+        codes = self.codes if mask is None else self.codes[mask]
+        codes = codes[codes >= 0]
+        if len(codes) == 0:
+            return []
+        present = np.flatnonzero(np.bincount(codes, minlength=len(self.code_key)))
+        by_key = {}
+        for c, k in zip(present.tolist(), self.code_key[present].tolist()):
+            if k >= 0:
+                by_key.setdefault(k, []).append(c)
+
+        lowers = {k: self.keys[k].lower() for k in by_key}
+        first = {}
+        counts = Counter(lowers.values())
+        for k, c_list in by_key.items():
+            # urutan kemunculan hanya perlu untuk key yang sama jika di-lower ("abc"/"ABC")
+            if counts[lowers[k]] > 1:
+                first[k] = int(np.argmax(np.isin(codes, c_list)))
+        ordered = sorted(by_key, key=lambda k: (lowers[k], first.get(k, 0)))
+        return [self.keys[k] for k in ordered]
+
+    def rows_for(self, displays):
+        """Bitmap baris (bool array) untuk nilai-nilai display yang dipilih."""
+        wanted = np.zeros(len(self.keys) + 1, dtype=bool)
+        for d in displays:
+            k = self.key_id.get(d)
+            if k is not None:
+                wanted[k] = True
+        # code_key -1 (NaN / tanpa key) jatuh ke slot terakhir yang selalu False
+        code_hit = np.append(wanted[self.code_key], False)
+        return code_hit[self.codes]
+
+
+class FilterIndex:
+    """Index filter per dataset; kolom diindeks saat pertama kali dipakai.
+
+    Opsi cascading & mask akhir dihitung dari irisan bitmap baris,
+    tanpa membuat DataFrame perantara untuk tiap langkah filter.
+    DataFrame tidak disimpan di sini (hanya kode), jadi harus diberikan
+    lagi saat kolom baru perlu diindeks. Index dipakai bersama antar sesi:
+    pengisian kolom baru dijaga lock, dan on_grow(index, nbytes) (jika
+    diisi) dipanggil dengan ukuran kolom baru agar store bisa menghitungnya.
+    """
+
+    def __init__(self, n_rows, display, on_grow=None):
+        self.n_rows = n_rows
+        self.display = display
+        self.on_grow = on_grow
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.n_rows
+
+    def column(self, df, col) -> ColumnIndex:
+        index = self._columns.get(col)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._columns.get(col)
+            if index is not None:
+                return index
+            index = ColumnIndex(df[col], self.display)
+            self._columns[col] = index
+        if self.on_grow is not None:
+            self.on_grow(self, approx_nbytes(index))
+        return index
+
+    def updated(self, df, kept_old, changed):
+        """FilterIndex untuk dataset hasil delta (lihat ColumnIndex.updated);
+        hanya kolom yang sudah diindeks yang dibawa."""
+        new = FilterIndex(len(df), self.display)
+        for col, index in self._columns.items():
+            if col in df.columns:
+                new._columns[col] = index.updated(df[col], kept_old, changed, self.display)
+        return new
+
+    def all_rows(self):
+        return np.ones(self.n_rows, dtype=bool)
+
+    def options(self, df, col, mask=None):
+        return self.column(df, col).present_keys(mask)
+
+    def rows_for(self, df, col, displays):
+        return self.column(df, col).rows_for(displays)
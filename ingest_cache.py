@@ -0,0 +1,242 @@
+import hashlib
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Lokasi & batas ukuran cache (bisa diatur lewat environment variable)
+CACHE_DIR = Path(os.environ.get("MAP_CACHE_DIR", ".ingest_cache"))
+CACHE_MAX_MB = float(os.environ.get("MAP_CACHE_MAX_MB", "2048"))
+# jumlah worker parse multi file/sheet (default: jumlah CPU)
+INGEST_WORKERS = int(os.environ.get("MAP_INGEST_WORKERS", "0")) or (os.cpu_count() or 1)
+# pool proses (spawn, ~2 s start) hanya jika total file yang di-parse minimal
+# sebesar ini; di bawahnya parse berurutan di proses ini lebih cepat
+INGEST_PROCESS_MIN_MB = float(os.environ.get("MAP_INGEST_PROCESS_MIN_MB", "32"))
+
+# kolom asal data saat beberapa file / sheet digabung
+SOURCE_FILE_COLUMN = "Sumber_File"
+SOURCE_SHEET_COLUMN = "Sumber_Sheet"
+
+
+def content_hash(data: bytes) -> str:
+    """Kunci cache berdasarkan isi file (bukan nama / objek upload)."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = df.columns.astype(str).str.strip()
+    return df
+
+
+def compact_dtypes(df: pd.DataFrame, max_unique_ratio=0.5) -> pd.DataFrame:
+    """Representasi hemat memori tanpa mengubah nilai:
+    - kolom teks berulang (mis. Propinsi/Kota/Warna) -> category
+    - integer -> tipe integer terkecil
+    - float -> float32 hanya jika semua nilai tetap persis sama
+    Kolom campur tipe (1, "1", 1.0) dibiarkan object agar display tetap sama."""
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object or isinstance(s.dtype, pd.StringDtype):
+            n_valid = int(s.notna().sum())
+            if n_valid and pd.api.types.infer_dtype(s, skipna=True) == "string":
+                if s.nunique(dropna=True) <= max_unique_ratio * n_valid:
+                    df[col] = s.astype("category")
+        elif pd.api.types.is_integer_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+            df[col] = pd.to_numeric(s, downcast="integer")
+        elif s.dtype == np.float64:
+            f32 = s.astype(np.float32)
+            same = (f32.astype(np.float64) == s) | (s.isna() & f32.isna())
+            if bool(same.all()):
+                df[col] = f32
+    return df
+
+
+def read_excel_fast(data: bytes, **kwargs) -> pd.DataFrame:
+    """Baca Excel dengan engine calamine (Rust, jauh lebih cepat);
+    fallback ke openpyxl jika python-calamine belum terpasang
+    (atau pandas < 2.2 yang belum mengenal engine calamine)."""
+    try:
+        return pd.read_excel(BytesIO(data), engine="calamine", **kwargs)
+    except (ImportError, ValueError):
+        return pd.read_excel(BytesIO(data), engine="openpyxl", **kwargs)
+
+
+def workbook_sheets(data: bytes) -> list:
+    """Nama semua sheet dalam workbook, sesuai urutan di file."""
+    try:
+        with pd.ExcelFile(BytesIO(data), engine="calamine") as xls:
+            return [str(name) for name in xls.sheet_names]
+    except (ImportError, ValueError):
+        with pd.ExcelFile(BytesIO(data), engine="openpyxl") as xls:
+            return [str(name) for name in xls.sheet_names]
+
+
+# ================= Spill ke disk (Parquet, fallback pickle) =================
+def _cache_files(key):
+    return CACHE_DIR / f"{key}.parquet", CACHE_DIR / f"{key}.pkl"
+
+
+def _read_spill(key):
+    for path in _cache_files(key):
+        if not path.exists():
+            continue
+        try:
+            df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_pickle(path)
+        except Exception:
+            # file rusak / engine hilang -> anggap cache miss
+            continue
+        os.utime(path)  # tandai baru dipakai (LRU berdasar mtime)
+        return df
+    return None
+
+
+def _write_spill(key, df):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    parquet_path, pickle_path = _cache_files(key)
+    tmp = parquet_path.with_suffix(".tmp")
+    try:
+        df.to_parquet(tmp, index=False)
+        tmp.replace(parquet_path)
+    except Exception:
+        # mis. kolom campur tipe (1, "1", 1.0) yang tidak bisa jadi Arrow,
+        # atau pyarrow tidak terpasang -> simpan apa adanya sebagai pickle
+        tmp.unlink(missing_ok=True)
+        with open(tmp, "wb") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(pickle_path)
+    evict_cache()
+
+
+def evict_cache(max_mb=None):
+    """Hapus file cache paling lama tidak dipakai sampai total <= max_mb."""
+    max_bytes = (CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    if not CACHE_DIR.exists():
+        return
+    files = []
+    for path in CACHE_DIR.iterdir():
+        if path.suffix not in (".parquet", ".pkl"):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def load_excel_cached(data: bytes, key=None, sheet_name=0) -> pd.DataFrame:
+    """Muat Excel lewat cache: disk (jika ada) atau parse lalu spill.
+    Hasil selalu dalam representasi ringkas (compact_dtypes)."""
+    key = key or content_hash(data)
+    df = _read_spill(key)
+    if df is not None:
+        # spill lama (sebelum compact_dtypes) ikut diringkas; no-op untuk yang baru
+        return compact_dtypes(df)
+    df = compact_dtypes(normalize_columns(read_excel_fast(data, sheet_name=sheet_name)))
+    try:
+        _write_spill(key, df)
+    except OSError:
+        # direktori cache tidak bisa ditulis -> tetap jalan tanpa cache
+        pass
+    return df
+
+
+def spill_frame(key, df):
+    """Simpan df (mis. data dari file progress) ke cache disk dengan key ini
+    agar bisa dimuat ulang lewat load_frame_cached."""
+    try:
+        _write_spill(key, df)
+    except OSError:
+        pass
+
+
+def load_frame_cached(key):
+    """Frame yang pernah di-spill dengan key ini; None jika tidak ada."""
+    df = _read_spill(key)
+    return compact_dtypes(df) if df is not None else None
+
+
+# ================= Multi file / multi sheet =================
+def _sheet_key(file_hash, sheet_name):
+    return f"{file_hash}-{content_hash(str(sheet_name).encode('utf-8'))[:12]}"
+
+
+def workbook_jobs(files):
+    """files: list (nama_file, bytes, sheet_dipilih, semua_sheet[, hash]).
+    Return list job (nama_file, sheet, bytes, spill_key). Hash isi file yang
+    sudah dihitung pemanggil dipakai ulang (tidak di-hash lagi). Sheet
+    pertama memakai key lama (hash file) agar cache disk upload satu file
+    tetap terpakai."""
+    jobs = []
+    for file_name, data, sheets, all_sheets, *known_hash in files:
+        file_hash = known_hash[0] if known_hash else content_hash(data)
+        for sheet in sheets:
+            key = file_hash if sheet == all_sheets[0] else _sheet_key(file_hash, sheet)
+            jobs.append((file_name, sheet, data, key))
+    return jobs
+
+
+def workbook_dataset_key(jobs):
+    """Kunci dataset gabungan; satu job -> key spill job itu sendiri."""
+    if len(jobs) == 1:
+        return jobs[0][3]
+    joined = "\n".join(f"{file_name}\t{sheet}\t{key}" for file_name, sheet, _, key in jobs)
+    return "multi-" + content_hash(joined.encode("utf-8"))
+
+
+def _parse_sheet(data, sheet_name):
+    # fungsi modul (bukan lambda) agar bisa dikirim ke proses worker
+    return compact_dtypes(normalize_columns(read_excel_fast(data, sheet_name=sheet_name)))
+
+
+def _parse_all(pending, max_workers):
+    """Parse job yang belum ada di cache disk. Lebih dari satu CPU & file
+    cukup besar -> pool proses (parse Excel terikat GIL); gagal membuat
+    proses (mis. sandbox) -> pool thread. Proses dibuat dengan "spawn",
+    bukan fork: server Streamlit multi-thread dan fork dari proses
+    multi-thread bisa deadlock."""
+    total_mb = sum(len(job[2]) for job in pending) / 2**20
+    if max_workers <= 1 or len(pending) <= 1 or total_mb < INGEST_PROCESS_MIN_MB:
+        return [_parse_sheet(data, sheet) for _, sheet, data, _ in pending]
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(_parse_sheet, [j[2] for j in pending], [j[1] for j in pending]))
+    except (OSError, BrokenProcessPool):
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(_parse_sheet, [j[2] for j in pending], [j[1] for j in pending]))
+
+
+def load_workbooks(jobs, max_workers=None) -> pd.DataFrame:
+    """Muat & gabungkan semua (file, sheet) dari workbook_jobs. Sheet yang
+    belum ada di cache disk di-parse bersamaan lalu di-spill per sheet.
+    Lebih dari satu sumber -> kolom Sumber_File & Sumber_Sheet ditambahkan
+    di depan; kolom yang tidak ada di suatu sheet berisi NaN."""
+    frames = [_read_spill(key) for _, _, _, key in jobs]
+    pending = [i for i, df in enumerate(frames) if df is None]
+    workers = min(INGEST_WORKERS if max_workers is None else max_workers, len(pending))
+    for i, df in zip(pending, _parse_all([jobs[i] for i in pending], workers)):
+        frames[i] = df
+        try:
+            _write_spill(jobs[i][3], df)
+        except OSError:
+            pass
+    if len(jobs) == 1:
+        return compact_dtypes(frames[0])
+
+    for (file_name, sheet, _, _), df in zip(jobs, frames):
+        df.drop(columns=[SOURCE_FILE_COLUMN, SOURCE_SHEET_COLUMN], errors="ignore", inplace=True)
+        df.insert(0, SOURCE_SHEET_COLUMN, sheet)
+        df.insert(0, SOURCE_FILE_COLUMN, file_name)
+    # category per sheet beda kategori -> concat jadi object; diringkas ulang
+    return compact_dtypes(pd.concat(frames, ignore_index=True))
@@ -0,0 +1,168 @@
+import json
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+import weakref
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Instrumentasi opsional per rerun. Aktif lewat env MAP_PROFILE atau query
+# param ?profile=...: "1"/"on" = waktu + memori puncak, "time" = waktu saja
+# (tracemalloc memperlambat eksekusi, jadi memori bisa dimatikan).
+PROFILE_ENV = "MAP_PROFILE"
+# path file JSONL; jika diisi, hasil tiap rerun ditambahkan ke file ini
+PROFILE_LOG_ENV = "MAP_PROFILE_LOG"
+
+_OFF = {"", "0", "off", "false", "no"}
+# tracemalloc berlaku untuk seluruh proses (semua sesi). Modul ini hanya
+# mematikannya jika ia yang menyalakan dan tidak ada lagi rerun berprofil
+# memori yang sedang berjalan.
+_tracing = {"active": 0, "owned": False}
+_tracing_lock = threading.Lock()
+
+
+def _acquire_tracing():
+    with _tracing_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing["owned"] = True
+        _tracing["active"] += 1
+        tracemalloc.reset_peak()
+
+
+def _release_tracing():
+    with _tracing_lock:
+        _tracing["active"] -= 1
+        if _tracing["active"] == 0 and _tracing["owned"]:
+            tracemalloc.stop()
+            _tracing["owned"] = False
+
+
+class StageProfiler:
+    """Catat waktu & memori puncak per tahap dengan checkpoint.
+
+    Tahap = potongan kode sejak checkpoint sebelumnya, jadi blok kode yang
+    diukur tidak perlu dibungkus / di-indent ulang. Jika tidak aktif semua
+    method tidak melakukan apa-apa.
+    """
+
+    def __init__(self, enabled=False, memory=True, log_path=None):
+        self.enabled = enabled
+        self.memory = enabled and memory
+        self.log_path = log_path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stages = []
+        self._started = self._last = time.perf_counter()
+        self._release = None
+        if self.memory:
+            _acquire_tracing()
+            # dilepas lewat finish(); rerun yang berhenti di tengah (st.stop,
+            # error) melepasnya saat profiler dibuang garbage collector
+            self._release = weakref.finalize(self, _release_tracing)
+
+    @classmethod
+    def from_mode(cls, mode, log_path=None):
+        mode = str(mode or "").strip().lower()
+        if mode in _OFF:
+            return cls(enabled=False)
+        return cls(enabled=True, memory=(mode != "time"), log_path=log_path or None)
+
+    def checkpoint(self, stage):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        record = {"stage": stage, "seconds": round(now - self._last, 4)}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record["peak_mb"] = round(peak / 2**20, 2)
+            record["current_mb"] = round(current / 2**20, 2)
+            tracemalloc.reset_peak()
+        self.stages.append(record)
+        self._last = now
+
+    def finish(self):
+        """Akhiri rerun: lepas tracemalloc (dimatikan jika tidak ada rerun
+        berprofil lain yang masih berjalan)."""
+        if self._release is not None:
+            self._release()
+
+    @property
+    def total_seconds(self):
+        return round(time.perf_counter() - self._started, 4)
+
+    def frame(self):
+        return pd.DataFrame(self.stages)
+
+    def write_log(self, **extra):
+        """Tambahkan hasil rerun ini sebagai satu baris JSON ke log_path."""
+        if not self.enabled or not self.log_path:
+            return
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "run_id": self.run_id,
+            "total_seconds": self.total_seconds,
+            "stages": self.stages,
+            **extra,
+        }
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        except OSError:
+            # log hanya alat bantu; jangan ganggu aplikasi
+            pass
+
+
+# ================= Laporan memori =================
+def approx_nbytes(obj, _seen=None):
+    """Perkiraan ukuran objek (byte): DataFrame/Series deep, array numpy,
+    string, serta isi dict/list/tuple dan atribut objek (rekursif)."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(sys.getsizeof(v) for v in obj.ravel().tolist())
+        return obj.nbytes
+    if isinstance(obj, (str, bytes, bytearray)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(approx_nbytes(k, seen) + approx_nbytes(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(approx_nbytes(v, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return sys.getsizeof(obj) + approx_nbytes(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+
+def process_peak_rss_mb():
+    """Memori puncak (RSS) proses ini; None jika tidak tersedia (mis. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KB, macOS: byte
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def memory_report(objects):
+    """DataFrame [objek, MB] untuk dict {nama: objek}; objek yang sama
+    (mis. df yang juga ada di cache) hanya dihitung sekali."""
+    seen = set()
+    rows = [
+        {"objek": name, "MB": round(approx_nbytes(obj, seen) / 2**20, 2)}
+        for name, obj in objects.items()
+        if obj is not None
+    ]
+    return pd.DataFrame(rows, columns=["objek", "MB"])
@@ -0,0 +1,580 @@
+import json
+
+import folium
+import numpy as np
+import pandas as pd
+from folium import plugins
+
+from radius_coverage import coverage_available, coverage_layer, coverage_union
+from draw_filter import points_in_shapes
+from map_render import BulkPointLayer
+from spatial_index import GeoGridIndex
+
+# Logika peta tanpa Streamlit: dipakai app.py (interaktif) dan
+# batch_render.py (headless) agar hasil keduanya selalu sama.
+
+# fallback center jika tidak ada titik valid (Indonesia)
+DEFAULT_CENTER = [-2.5489, 118.0149]
+ALL_OPTION = "Pilih Semua"
+NO_LEGEND = "(Tidak ada)"
+FILTER_HIERARCHY = ["Propinsi", "Kota", "Kanwil"]
+MAIN_COLUMNS = ["Latitude", "Longitude", "NamaTitik"]
+
+
+# === Helpers untuk normalisasi tampilan nilai (angka & campur tipe) ===
+def normalize_display(v):
+    """Kembalikan string display yang stabil untuk angka & non-angka.
+       - 1 dan 1.0 -> '1'
+       - 1.50 -> '1.5'
+       - selain angka -> str(v)
+    """
+    # Tangani NaN awal
+    try:
+        if pd.isna(v):
+            return None
+    except TypeError:
+        pass
+
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        f = float(v)
+        if np.isfinite(f):
+            if f.is_integer():
+                return str(int(f))
+            else:
+                s = ('%f' % f).rstrip('0').rstrip('.')
+                return s
+        else:
+            return str(v)
+
+    if isinstance(v, str):
+        s = v.strip()
+        if s == "":
+            return s
+        try:
+            f = float(s)
+            if np.isfinite(f):
+                if f.is_integer():
+                    return str(int(f))
+                else:
+                    return ('%f' % f).rstrip('0').rstrip('.')
+        except Exception:
+            pass
+        return s
+    return str(v)
+
+# teks angka desimal biasa (ASCII) -> diparse sekaligus; teks lain yang
+# masih mungkin diterima float() / strip() Python secara berbeda ("1_000",
+# digit & spasi non-ASCII, \x1c-\x1f) dihitung per nilai
+_DECIMAL_TEXT = r"[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?"
+_UNUSUAL_TEXT = r"[_\x1c-\x1f]|[^\x00-\x7f]"
+
+# operasi string kolom teks lewat Arrow jika pyarrow terpasang
+try:
+    import pyarrow  # noqa: F401
+    _TEXT_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    _TEXT_DTYPE = pd.StringDtype("python")
+
+
+def _format_floats(f):
+    """normalize_display untuk array float64 berhingga tanpa loop Python:
+    bilangan bulat lewat int64, pecahan lewat pembulatan 6 desimal (= '%f').
+    Nilai yang hasilnya bisa beda dari '%f' (hampir seri saat dibulatkan,
+    sangat besar) tetap dihitung satu per satu."""
+    out = np.empty(len(f), dtype=object)
+    whole = np.floor(f) == f
+    scaled = f * 1e6
+    # f * 1e6 sudah dibulatkan sekali; dekat .5 bisa beda dari '%f' (nilai persis)
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.spacing(np.abs(scaled))
+    fast_int = whole & (np.abs(f) < 2.0 ** 63)
+    fast_frac = ~whole & ~near_tie & (np.abs(scaled) < 2.0 ** 52)
+    if fast_int.any():
+        out[fast_int] = f[fast_int].astype(np.int64).astype(str).tolist()
+    if fast_frac.any():
+        r = np.abs(np.rint(scaled[fast_frac])).astype(np.int64)
+        units = (r // 1_000_000).astype(str)
+        decimals = np.char.rstrip(np.char.zfill((r % 1_000_000).astype(str), 6), "0")
+        text = np.where(decimals == "", units, np.char.add(np.char.add(units, "."), decimals))
+        text = np.where(f[fast_frac] < 0, np.char.add("-", text), text)
+        out[fast_frac] = text.tolist()
+    slow = ~(fast_int | fast_frac)
+    out[slow] = [normalize_display(v) for v in f[slow].tolist()]
+    return out
+
+def _display_numbers(f):
+    out = np.full(len(f), None, dtype=object)
+    finite = np.isfinite(f)
+    out[finite] = _format_floats(f[finite])
+    infinite = np.isinf(f)
+    out[infinite] = np.where(f[infinite] > 0, "inf", "-inf").tolist()
+    return out
+
+def _display_texts(values):
+    raw = np.asarray(values, dtype=object)
+    out = np.full(len(raw), None, dtype=object)
+    present = pd.notna(raw)
+    raw = raw[present]
+    text = pd.Series(raw).astype(_TEXT_DTYPE)
+    unusual = text.str.contains(_UNUSUAL_TEXT, regex=True).to_numpy(dtype=bool)
+    text = text.str.strip()
+    decimal = ~unusual & text.str.fullmatch(_DECIMAL_TEXT).to_numpy(dtype=bool)
+    result = text.to_numpy(dtype=object)
+    if decimal.any():
+        # object -> float64 memakai float() per elemen (parse persis sama)
+        f = result[decimal].astype(np.float64)
+        finite = np.isfinite(f)
+        parsed = result[decimal]
+        parsed[finite] = _format_floats(f[finite])
+        result[decimal] = parsed
+    if unusual.any():
+        result[unusual] = [normalize_display(v) for v in raw[unusual]]
+    out[present] = result
+    return out
+
+def normalize_display_values(values):
+    """normalize_display untuk banyak nilai sekaligus (mis. nilai unik satu
+    kolom) -> array object, identik dengan [normalize_display(v) for v in values].
+    Jalur cepat per dtype: kolom angka tanpa konversi ke teks, kolom teks
+    lewat operasi string vectorized, category cukup per kategori; tipe lain
+    (bool, tanggal, campur) tetap per nilai."""
+    dtype = getattr(values, "dtype", None)
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = normalize_display_values(values.categories)
+        return np.append(categories, None)[np.asarray(values.codes)]
+    if dtype is not None and pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        return _display_numbers(pd.Series(values).to_numpy(dtype=np.float64, na_value=np.nan))
+
+    kind = pd.api.types.infer_dtype(values, skipna=True) if len(values) else "empty"
+    if kind == "string":
+        return _display_texts(values)
+    if kind in ("integer", "floating", "mixed-integer-float"):
+        try:
+            return _display_numbers(pd.Series(values, dtype=object).to_numpy(dtype=np.float64, na_value=np.nan))
+        except (OverflowError, TypeError, ValueError):
+            pass
+    return np.array([normalize_display(v) for v in values] + [None], dtype=object)[:-1]
+
+def display_keys(series: pd.Series) -> pd.Series:
+    """normalize_display untuk seluruh kolom; dihitung sekali per nilai unik."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    keys = np.append(normalize_display_values(uniques), np.nan)
+    return pd.Series(keys[codes], index=series.index, dtype=object)
+
+
+# === Available Colors ===
+available_folium_colors = [
+    "red", "blue", "green", "purple", "orange", "darkred", "lightred",
+    "beige", "darkblue", "darkgreen", "cadetblue", "darkpurple",
+    "white", "pink", "lightblue", "lightgreen", "gray", "black", "lightgray"
+]
+
+# warna marker folium -> hex (ikon cluster HTML & tile raster)
+FOLIUM_COLOR_HEX = {
+    "red": "#d63e2a", "blue": "#38aadd", "green": "#72b026", "purple": "#d252b9",
+    "orange": "#f69730", "darkred": "#a23336", "lightred": "#ff8e7f", "beige": "#ffcb92",
+    "darkblue": "#0067a3", "darkgreen": "#728224", "cadetblue": "#436978",
+    "darkpurple": "#5b396b", "white": "#fbfbfb", "pink": "#ff91ea", "lightblue": "#8adaff",
+    "lightgreen": "#bbf970", "gray": "#575757", "black": "#303030", "lightgray": "#a3a3a3",
+}
+
+
+# === Normalisasi warna folium (handle typo / case) ===
+COLOR_ALIASES = {
+    "darkklue": "darkblue",
+    "darkblu": "darkblue",
+    "darkbue": "darkblue",
+    "lightgren": "lightgreen",
+    "ligtgreen": "lightgreen",
+    "purpel": "purple",
+}
+
+def normalize_folium_color(c):
+    if c is None:
+        return None
+    s = str(c).strip().lower()
+    if s in COLOR_ALIASES:
+        s = COLOR_ALIASES[s]
+    return s
+
+def _color_column(data, col):
+    """Nilai kolom warna yang sudah dinormalisasi; None jika kosong / tidak ada."""
+    if col not in data.columns:
+        return pd.Series(None, index=data.index, dtype=object)
+    s = data[col]
+    s = s[s.notna()].astype(str).str.strip()
+    s = s[s != ""].str.lower().replace(COLOR_ALIASES)
+    return s.reindex(data.index).astype(object)
+
+def resolve_marker_colors(data, warna_column=None, custom_colors=None):
+    """Tentukan warna marker untuk seluruh baris sekaligus (column-wise).
+    Prioritas sama dengan aturan per-baris sebelumnya:
+    1) Custom mapping (berdasarkan warna_column yang dipilih)
+    2) Kolom Warna_Akhir (jika ada & tidak kosong)
+    3) Kolom Warna (jika ada & tidak kosong)
+    4) Default 'blue'
+    """
+    colors = pd.Series(normalize_folium_color("blue"), index=data.index, dtype=object)
+    for col in ("Warna", "Warna_Akhir"):
+        layer = _color_column(data, col)
+        colors = layer.where(layer.notna(), colors)
+
+    if custom_colors and warna_column and warna_column in data.columns:
+        custom = {str(k): normalize_folium_color(v) for k, v in custom_colors.items()}
+        keys = display_keys(data[warna_column])
+        hit = keys.isin(list(custom.keys())) & (keys != "")
+        colors = colors.where(~hit, keys.map(custom))
+    return colors
+
+def icon_colors(colors):
+    """Warna yang dikenal folium; selain itu jatuh ke biru."""
+    return colors.where(colors.isin(available_folium_colors), "blue")
+
+
+# === Koordinat ===
+def sanitize_coordinates(df, col_lat, col_lon, name_column):
+    """Rename kolom utama ke Latitude/Longitude/NamaTitik & ubah koordinat
+    ke angka (baris rusak tetap disimpan). Return (df, mask_valid)."""
+    # --- Rename kolom utama ---
+    df = df.rename(columns={col_lat: "Latitude", col_lon: "Longitude", name_column: "NamaTitik"})
+
+    # 1) Ganti koma menjadi titik (angka desimal ditulis dengan koma), lalu
+    # 2) konversi ke numerik (yang gagal -> NaN) -> baris tetap ada
+    df["Latitude"]  = _coordinate_values(df["Latitude"])
+    df["Longitude"] = _coordinate_values(df["Longitude"])
+
+    # 3) Mask valid untuk kebutuhan MAP saja (df tidak dipangkas)
+    return df, coordinate_mask(df)
+
+def _coordinate_values(s):
+    """Kolom koordinat -> angka. Kolom float64 / integer sudah numerik:
+    langsung dipakai tanpa bolak-balik ke teks. Integer hasilnya sama
+    persis dengan jalur teks. Float64 = nilai asli dari file; jalur teks
+    (to_numeric tidak selalu membulatkan tepat) bisa berbeda hingga ~3e-14
+    derajat untuk nilai presisi penuh. Koordinat hingga 6 desimal sama."""
+    if s.dtype == np.float64:
+        return s
+    if isinstance(s.dtype, np.dtype) and s.dtype.kind in "iu" and s.dtype != np.uint64:
+        return s.astype(np.int64)
+    return pd.to_numeric(s.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+def coordinate_mask(df):
+    """Baris dengan Latitude/Longitude numerik yang valid untuk peta."""
+    return (
+        pd.notna(df["Latitude"]) & pd.notna(df["Longitude"]) &
+        np.isfinite(df["Latitude"]) & np.isfinite(df["Longitude"]) &
+        df["Latitude"].between(-90, 90, inclusive="both") &
+        df["Longitude"].between(-180, 180, inclusive="both")
+    )
+
+
+# === Filter ===
+def restore_selection(saved, options):
+    """Pilihan tersimpan yang masih ada di options; kosong -> Pilih Semua."""
+    saved = [v for v in (saved or [ALL_OPTION]) if v in options]
+    return saved or [ALL_OPTION]
+
+def additional_filter_columns(df):
+    return [col for col in df.columns if col not in FILTER_HIERARCHY + MAIN_COLUMNS]
+
+def apply_saved_filters(df, filter_index, settings):
+    """Terapkan filter dari settings progress tanpa UI (urutan cascading
+    sama seperti sidebar). Return mask baris; ValueError jika kosong."""
+    row_mask = filter_index.all_rows()
+    selections = settings.get("filter_selections", {})
+    for col in FILTER_HIERARCHY:
+        if col in df.columns:
+            options = [ALL_OPTION] + filter_index.options(df, col, row_mask)
+            selected = restore_selection(selections.get(col), options)
+            if ALL_OPTION not in selected:
+                row_mask &= filter_index.rows_for(df, col, selected)
+    if not row_mask.any():
+        raise ValueError("Tidak ada data setelah filter diterapkan.")
+
+    extra_cols = additional_filter_columns(df)
+    extra_values = settings.get("additional_filter_values", {})
+    for col in settings.get("additional_filter_cols_saved", []):
+        if col not in extra_cols:
+            continue
+        options = [ALL_OPTION] + filter_index.options(df, col, row_mask)
+        selected = restore_selection(extra_values.get(col), options)
+        if ALL_OPTION not in selected:
+            row_mask &= filter_index.rows_for(df, col, selected)
+            if not row_mask.any():
+                raise ValueError(f"Tidak ada data setelah filter '{col}' diterapkan.")
+
+    shapes = settings.get("draw_shapes") or []
+    if shapes and settings.get("draw_filter", True):
+        row_mask &= points_in_shapes(df["Latitude"], df["Longitude"], shapes)
+        if not row_mask.any():
+            raise ValueError("Tidak ada titik di dalam area yang digambar.")
+    return row_mask
+
+
+# === Legenda Peta (Dinamis) ===
+# urutan legenda: key disimpan di settings, label untuk UI
+LEGEND_SORTS = {"alpha": "Abjad", "count": "Jumlah Titik"}
+
+def legend_stats(values, colors):
+    """Agregasi legenda tanpa loop per baris: satu baris per label (display)
+    dengan warna paling sering & jumlah titik. Urutan = kemunculan pertama
+    label; warna seri dipilih yang muncul lebih dulu (sama seperti Counter)."""
+    # label display dihitung sekali per nilai unik, lalu semua kerja di kode int
+    value_codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    label_of_unique, labels = pd.factorize(
+        pd.Series(normalize_display_values(uniques), dtype=object), use_na_sentinel=True
+    )
+    labels = np.asarray(labels, dtype=object)
+    label_ok = np.append(labels != "", False)  # slot terakhir: kode -1 (NaN / None)
+    label_codes = np.append(label_of_unique, -1)[value_codes]
+    valid = np.flatnonzero(label_ok[label_codes])
+    if len(valid) == 0:
+        return pd.DataFrame({"label": [], "color": [], "count": []})
+
+    color_codes, palette = pd.factorize(colors, use_na_sentinel=False)
+    n_colors = max(len(palette), 1)
+    keys = label_codes[valid].astype(np.int64) * n_colors + color_codes[valid]
+    if len(labels) * n_colors <= len(keys):
+        # tabel padat label x warna: cukup bincount tanpa sort
+        pair_count = np.bincount(keys, minlength=len(labels) * n_colors)
+        first_row = np.full(len(pair_count), len(label_codes), dtype=np.int64)
+        first_row[keys[::-1]] = valid[::-1]  # assignment terakhir menang -> kemunculan pertama
+        pair_keys = np.flatnonzero(pair_count)
+        pair_count, first_row = pair_count[pair_keys], first_row[pair_keys]
+    else:
+        pair_keys, first_row, pair_count = np.unique(keys, return_index=True, return_counts=True)
+        first_row = valid[first_row]
+    pair_label, pair_color = pair_keys // n_colors, pair_keys % n_colors
+
+    # per label: jumlah terbanyak, seri -> warna yang muncul lebih dulu
+    order = np.lexsort((first_row, -pair_count, pair_label))
+    head = np.ones(len(order), dtype=bool)
+    head[1:] = pair_label[order][1:] != pair_label[order][:-1]
+    best = order[head]
+
+    label_first = np.full(len(labels), len(label_codes), dtype=np.int64)
+    np.minimum.at(label_first, pair_label, first_row)
+    label_total = np.bincount(pair_label, weights=pair_count, minlength=len(labels)).astype(np.int64)
+    by_appearance = np.argsort(label_first[pair_label[best]], kind="stable")
+    best = best[by_appearance]
+    return pd.DataFrame({
+        "label": labels[pair_label[best]],
+        "color": np.asarray(palette, dtype=object)[pair_color[best]],
+        "count": label_total[pair_label[best]],
+    })
+
+def legend_html(df_map, map_colors, legend_col, sort="alpha", show_counts=True, max_items=25):
+    if legend_col in (None, NO_LEGEND) or legend_col not in df_map.columns:
+        return None
+
+    stats = legend_stats(df_map[legend_col], map_colors)
+    stats["key"] = stats["label"].astype(str).str.lower()
+    if sort == "count":
+        stats = stats.sort_values(["count", "key"], ascending=[False, True], kind="stable")
+    else:
+        stats = stats.sort_values("key", kind="stable")
+
+    # batasi agar legend tidak terlalu panjang
+    legend_items = ""
+    top = stats.head(max_items)
+    for label, c, count in zip(top["label"], top["color"], top["count"].tolist()):
+        suffix = f" <span style='color:#666;'>({count:,})</span>" if show_counts else ""
+        legend_items += (
+            "<div style='display:flex;align-items:center;margin-bottom:4px;'>"
+            f"<div style='width:12px;height:12px;border-radius:50%;background:{c};"
+            f"{'border:1px solid #ccc;' if c == 'white' else ''}"
+            "margin-right:6px;'></div>"
+            f"{label}{suffix}</div>"
+        )
+    if len(stats) > max_items:
+        legend_items += "<div style='margin-top:6px; color:#666;'>...</div>"
+
+    return f"""
+    <div style="position:absolute; bottom:10px; right:10px; z-index:9999; background-color:white;
+        padding:10px; border:2px solid #ccc; border-radius:8px; box-shadow:2px 2px 5px rgba(0,0,0,0.3);
+        font-size:14px; max-width:220px; max-height:240px; overflow:auto;">
+        <b>Legenda ({legend_col}):</b><br>
+        <div style="margin-top:5px;">{legend_items}</div>
+    </div>
+    """
+
+
+# === Mode marker massal (satu payload kolumnar, bukan folium.Marker per baris) ===
+BULK_MARKER_CALLBACK = """(function () {
+    var palette = %s;
+    return function (row) {
+        var icon = L.AwesomeMarkers.icon({
+            icon: "info-sign", prefix: "glyphicon", markerColor: palette[row[2]]
+        });
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+        marker.bindPopup(String(row[3]));
+        return marker;
+    };
+})()"""
+
+def bulk_marker_layer(data, colors, cluster=True, popups=None):
+    """Semua titik sebagai satu layer dengan payload kolumnar.
+    Payload per titik hanya [lat, lon, kode_warna, popup]; warna disimpan
+    sekali di palette. Cluster aktif -> FastMarkerCluster; cluster mati ->
+    BulkPointLayer (circleMarker di canvas, tanpa plugin markercluster).
+    popups: teks popup per titik (default NamaTitik).
+    """
+    codes, palette = pd.factorize(colors.to_numpy(), use_na_sentinel=False)
+    rows = list(zip(
+        data["Latitude"].astype(float).tolist(),
+        data["Longitude"].astype(float).tolist(),
+        codes.tolist(),
+        (data["NamaTitik"] if popups is None else popups).astype(str).tolist(),
+    ))
+    if not cluster:
+        hex_palette = [FOLIUM_COLOR_HEX.get(str(c), FOLIUM_COLOR_HEX["blue"]) for c in palette]
+        return BulkPointLayer(rows, hex_palette, name="Markers")
+    callback = BULK_MARKER_CALLBACK % json.dumps([str(c) for c in palette])
+    return plugins.FastMarkerCluster(rows, callback=callback, name="Markers", chunkedLoading=True)
+
+def marker_layer(df_map, colors, enable_cluster=False, bulk_threshold=5000, popups=None):
+    """Layer marker: mode massal di atas bulk_threshold titik, selain itu
+    folium.Marker per titik (dalam MarkerCluster jika cluster aktif)."""
+    if len(df_map) > bulk_threshold:
+        return bulk_marker_layer(df_map, colors, cluster=enable_cluster, popups=popups)
+
+    popups = df_map["NamaTitik"] if popups is None else popups
+    marker_group = plugins.MarkerCluster() if enable_cluster else folium.FeatureGroup(name="Markers")
+    for lat, lon, popup, warna in zip(df_map["Latitude"], df_map["Longitude"], popups, colors):
+        folium.Marker(
+            location=[lat, lon],
+            popup=popup,
+            icon=folium.Icon(color=warna, icon="info-sign")
+        ).add_to(marker_group)
+    return marker_group
+
+
+# === Analitik Radius Bertingkat (pakai spatial index, bukan O(n²)) ===
+def radius_coverage(index, data, colors, target, radius_km, max_names=10):
+    """Hitung titik lain dalam radius_km dari tiap titik berwarna target.
+    Return (detail per target, jumlah titik unik yang tercakup).
+    """
+    target_pos = np.flatnonzero((colors == target).to_numpy())
+    counts, _, pair_point = index.query_radius(
+        index.lat[target_pos], index.lon[target_pos], radius_km, exclude=target_pos
+    )
+    names = data["NamaTitik"].astype(str).to_numpy()
+    groups = np.split(pair_point, np.cumsum(counts)[:-1]) if len(counts) else []
+    detail = pd.DataFrame({
+        "NamaTitik": names[target_pos],
+        "Jumlah_Titik": counts,
+        "Titik_Dalam_Radius": [
+            ", ".join(names[g[:max_names]]) + (", ..." if len(g) > max_names else "")
+            for g in groups
+        ],
+    }, index=data.index[target_pos])
+    return detail, int(np.unique(pair_point).size)
+
+def radius_tiers(radius_cfg):
+    """Tingkat radius yang aktif dari settings["radius"] sebagai
+    [(i, jarak_km, warna_lingkaran, warna_target)]. Key boleh int atau str
+    (setelah JSON semua key menjadi str)."""
+    tiers = []
+    for i in range(1, 4):
+        cfg = radius_cfg.get(i, radius_cfg.get(str(i), {}))
+        if cfg.get("enabled"):
+            tiers.append((i, float(cfg.get("distance", 1.0)), cfg.get("color", "red"), cfg.get("target", "blue")))
+    return tiers
+
+def radius_layers(df_map, map_colors, radius_cfg, union=False):
+    """Lingkaran + analitik tiap tingkat radius aktif.
+    union=True (butuh shapely): lingkaran satu tingkat digabung menjadi satu
+    poligon cakupan & luasnya masuk ringkasan.
+    Return (layers, detail per tingkat, ringkasan per tingkat)."""
+    layers, radius_details, radius_summary = [], {}, []
+    tiers = radius_tiers(radius_cfg)
+    if not tiers:
+        return layers, radius_details, radius_summary
+
+    # spatial index dibangun sekali atas koordinat df_map untuk semua tingkat
+    geo_index = GeoGridIndex(df_map["Latitude"], df_map["Longitude"])
+    union = union and coverage_available()
+    for i, radius_km, circle_color, target in tiers:
+        detail, covered = radius_coverage(geo_index, df_map, map_colors, target, radius_km)
+        radius_details[i] = detail
+        radius_summary.append({
+            "Radius": f"#{i}",
+            "Jarak (km)": radius_km,
+            "Warna Target": target,
+            "Jumlah Target": len(detail),
+            "Titik Tercakup": covered,
+            "Rata-rata per Target": round(float(detail["Jumlah_Titik"].mean()), 2) if len(detail) else 0.0,
+            "Maks per Target": int(detail["Jumlah_Titik"].max()) if len(detail) else 0,
+        })
+
+        targets = df_map.loc[detail.index]
+        if union:
+            polygon, area = coverage_union(
+                targets["Latitude"].to_numpy(dtype=float), targets["Longitude"].to_numpy(dtype=float), radius_km
+            )
+            radius_summary[-1]["Luas Cakupan (km²)"] = round(area, 2)
+            layers.append(coverage_layer(polygon, circle_color, name=f"Radius #{i}"))
+            continue
+
+        circle_group = folium.FeatureGroup(name=f"Radius #{i}")
+        for lat, lon in zip(targets["Latitude"], targets["Longitude"]):
+            folium.Circle(
+                radius=radius_km * 1000,
+                location=[lat, lon],
+                color=circle_color,
+                fill=True,
+                fill_opacity=0.2
+            ).add_to(circle_group)
+        layers.append(circle_group)
+    return layers, radius_details, radius_summary
+
+
+def map_center(df_map):
+    # Center map: kalau tidak ada titik valid, fallback Indonesia
+    if df_map.empty:
+        return list(DEFAULT_CENTER)
+    return [float(df_map["Latitude"].mean()), float(df_map["Longitude"].mean())]
+
+
+# === Slice tanpa salinan penuh ===
+def color_columns(df, warna_column):
+    """Kolom yang dibaca resolve_marker_colors."""
+    return [c for c in dict.fromkeys(["Warna", "Warna_Akhir", warna_column]) if c in df.columns]
+
+def filtered_rows(df, row_mask):
+    """Baris hasil filter; tanpa salinan jika semua baris terpilih."""
+    return df if row_mask.all() else df[row_mask]
+
+def map_frame(df, row_mask, mask_valid, extra_columns=()):
+    """Baris yang tampil di peta (lolos filter & koordinat valid), hanya
+    kolom yang dipakai peta/legenda/radius, bukan salinan seluruh df."""
+    columns = list(dict.fromkeys(MAIN_COLUMNS + [c for c in extra_columns if c in df.columns]))
+    return df.loc[row_mask & np.asarray(mask_valid, dtype=bool), columns]
+
+
+# === Export Data (tetap pakai baris rusak agar ikut export) ===
+# pandas >= 3 selalu copy-on-write (keyword copy sudah deprecated)
+_CONCAT_NO_COPY = {} if int(pd.__version__.split(".")[0]) >= 3 else {"copy": False}
+
+def export_frame(df, row_mask, marker_colors, radius_details, nearest=None):
+    extra = {
+        # konsisten dengan warna di peta
+        "Warna_Akhir": marker_colors,
+    }
+    for i, detail in radius_details.items():
+        # hanya titik target yang punya nilai; lainnya kosong
+        extra[f"Jumlah_Titik_Radius_{i}"] = detail["Jumlah_Titik"].reindex(marker_colors.index)
+    if nearest is not None:
+        # jarak & nama titik terdekat per kategori; koordinat tidak valid -> kosong
+        for col in nearest.columns:
+            extra[col] = nearest[col].reindex(marker_colors.index)
+    base = filtered_rows(df, row_mask)
+    # kolom lain tidak disalin ulang: cukup digabung berdampingan
+    replaced = [c for c in extra if c in base.columns]
+    out = pd.concat(
+        [base.drop(columns=replaced) if replaced else base, pd.DataFrame(extra, index=base.index)],
+        axis=1, **_CONCAT_NO_COPY
+    )
+    if replaced:
+        # kolom yang sudah ada (mis. Warna_Akhir dari export sebelumnya) tetap di posisinya
+        out = out[list(base.columns) + [c for c in extra if c not in base.columns]]
+    return out
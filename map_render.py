@@ -0,0 +1,106 @@
+import folium
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from folium.template import Template
+from branca.element import MacroElement
+
+# nama variabel peta sementara; diganti nama peta sebenarnya saat dirender
+PRERENDER_PARENT = "map_prerender"
+
+
+class PrerenderedLayer(JSCSSMixin, MacroElement):
+    """Layer yang script-nya sudah dirender sebelumnya.
+
+    Ribuan Marker/Circle dirender sekali menjadi satu string JS; setiap rerun
+    berikutnya cukup menempelkan string itu ke peta baru, tanpa membangun &
+    merender ulang ribuan objek folium.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            {{ this.script_for(this._parent.get_name()) }}
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, js, default_js=(), default_css=()):
+        super().__init__()
+        self._name = "PrerenderedLayer"
+        self.js = js
+        self.default_js = list(default_js)
+        self.default_css = list(default_css)
+
+    def script_for(self, parent_name):
+        return self.js.replace(PRERENDER_PARENT, parent_name)
+
+
+class BulkPointLayer(Layer):
+    """Titik massal tanpa cluster: satu payload kolumnar, digambar sebagai
+    circleMarker di satu renderer canvas (bukan ribuan elemen DOM).
+
+    data    : [[lat, lon, kode_warna, popup], ...]
+    palette : warna (hex) untuk tiap kode_warna
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var palette = {{ this.palette|tojson }};
+                var data = {{ this.data|tojson }};
+                var renderer = L.canvas({padding: 0.5});
+                var group = L.featureGroup();
+                for (var i = 0; i < data.length; i++) {
+                    var row = data[i];
+                    L.circleMarker([row[0], row[1]], {
+                        renderer: renderer, radius: {{ this.radius }}, weight: 1,
+                        color: "#ffffff", fillColor: palette[row[2]], fillOpacity: 0.9
+                    }).bindPopup(String(row[3])).addTo(group);
+                }
+                return group;
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, data, palette, radius=5, name=None, overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "BulkPointLayer"
+        self.data = data
+        self.palette = list(palette)
+        self.radius = radius
+
+
+def _walk(element):
+    yield element
+    for child in element._children.values():
+        yield from _walk(child)
+
+
+def prerender(layers):
+    """Render layer folium (FeatureGroup, MarkerCluster, ...) sekali.
+    Return dict {js, default_js, default_css} untuk PrerenderedLayer."""
+    m = folium.Map(tiles=None)
+    m._id = PRERENDER_PARENT.replace("map_", "")
+    for layer in layers:
+        layer.add_to(m)
+    figure = m.get_root()
+    figure.render()
+
+    scripts = [
+        el.render()
+        for name, el in figure.script._children.items()
+        if name != PRERENDER_PARENT
+    ]
+    js_links, css_links = {}, {}
+    for layer in layers:
+        for el in _walk(layer):
+            if isinstance(el, JSCSSMixin):
+                js_links.update(dict(el.default_js))
+                css_links.update(dict(el.default_css))
+    return {
+        "js": "\n".join(scripts),
+        "default_js": list(js_links.items()),
+        "default_css": list(css_links.items()),
+    }
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from map_core import color_columns, display_keys, resolve_marker_colors
+from spatial_index import GeoGridIndex
+
+# pilihan kolom kategori di sidebar; "(Warna Marker)" = warna akhir di peta
+NEAREST_NONE = "(Tidak ada)"
+NEAREST_MARKER_COLOR = "(Warna Marker)"
+
+
+def nearest_columns(target):
+    """Nama kolom (jarak km, nama) hasil enrichment untuk satu kategori target."""
+    return f"Jarak_Terdekat_{target}_km", f"Nama_Terdekat_{target}"
+
+
+def _locations(lat, lon):
+    """Lokasi unik (koordinat persis sama digabung) -> (lokasi, kode per
+    titik, titik pertama & kedua tiap lokasi, jumlah titik per lokasi)."""
+    coords = np.column_stack([lat, lon])
+    unique, first, codes, counts = np.unique(coords, axis=0, return_index=True, return_inverse=True,
+                                             return_counts=True)
+    codes = codes.ravel()
+    # titik kedua tiap lokasi (untuk titik yang lokasinya dipakai bersama)
+    by_location = np.argsort(codes, kind="stable")
+    starts = np.cumsum(counts) - counts
+    second = np.where(counts > 1, by_location[np.minimum(starts + 1, len(codes) - 1)], -1)
+    return unique, codes, first, second, counts
+
+
+def nearest_by_category(lat, lon, names, categories, targets):
+    """Untuk tiap titik: jarak (km) & nama titik terdekat berkategori target,
+    per target. Titik berkategori sama tidak dibandingkan dengan dirinya
+    sendiri (mis. cabang sendiri terdekat). Satu GeoGridIndex per target,
+    dibangun atas lokasi unik agar koordinat kembar tidak membengkakkan
+    jumlah kandidat. Return DataFrame posisional (urutan = input)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    names = np.asarray(names, dtype=object)
+    categories = np.asarray(categories, dtype=object)
+    out = {}
+    for target in targets:
+        dist_col, name_col = nearest_columns(target)
+        members = np.flatnonzero(categories == target)
+        dist = np.full(len(lat), np.nan)
+        nearest = np.full(len(lat), -1, dtype=np.int64)
+        if len(members):
+            unique, codes, first, second, counts = _locations(lat[members], lon[members])
+            index = GeoGridIndex(unique[:, 0], unique[:, 1])
+            # anggota target yang lokasinya hanya dirinya -> lokasi itu dikecualikan
+            exclude = np.full(len(lat), -1, dtype=np.int64)
+            alone = counts[codes] == 1
+            exclude[members[alone]] = codes[alone]
+            location_dist, location = index.query_nearest(lat, lon, exclude=exclude)
+            found = location >= 0
+            dist[found] = location_dist[found]
+            nearest[found] = members[first[location[found]]]
+            # lokasi dipakai bersama anggota lain -> jarak 0 ke anggota lain di lokasi itu
+            shared = ~alone
+            own = members[shared]
+            other = np.where(first[codes[shared]] == np.flatnonzero(shared), second[codes[shared]],
+                             first[codes[shared]])
+            dist[own] = 0.0
+            nearest[own] = members[other]
+        out[dist_col] = np.round(dist, 3)
+        out[name_col] = np.where(nearest >= 0, names[np.maximum(nearest, 0)], None)
+    return pd.DataFrame(out)
+
+
+def nearest_categories(df, mask_valid, column, warna_column=None, custom_colors=None):
+    """Kategori tiap titik valid: display-key kolom terpilih (sama dengan
+    opsi filter), atau warna marker akhir untuk NEAREST_MARKER_COLOR."""
+    valid = np.asarray(mask_valid, dtype=bool)
+    if column == NEAREST_MARKER_COLOR:
+        data = df.loc[valid, color_columns(df, warna_column)]
+        return resolve_marker_colors(data, warna_column, custom_colors).to_numpy(dtype=object)
+    return display_keys(df.loc[valid, column]).to_numpy(dtype=object)
+
+
+def nearest_enrichment(df, mask_valid, settings):
+    """Enrichment jarak terdekat dari settings (nearest_column,
+    nearest_targets) atas semua titik berkoordinat valid, tidak tergantung
+    filter. Return DataFrame ber-index baris df yang valid, atau None."""
+    column = settings.get("nearest_column", NEAREST_NONE)
+    targets = [str(t) for t in settings.get("nearest_targets", [])]
+    if column in (None, NEAREST_NONE) or not targets:
+        return None
+    if column != NEAREST_MARKER_COLOR and column not in df.columns:
+        return None
+    valid = np.asarray(mask_valid, dtype=bool)
+    warna_column = settings.get("warna_column_saved")
+    custom_colors = {str(k): v for k, v in settings.get("kcp_custom_colors", {}).items()}
+    categories = nearest_categories(df, valid, column, warna_column, custom_colors)
+    points = df.loc[valid]
+    result = nearest_by_category(
+        points["Latitude"].to_numpy(dtype=float), points["Longitude"].to_numpy(dtype=float),
+        points["NamaTitik"].astype(str).to_numpy(), categories, targets,
+    )
+    result.index = points.index
+    return result
+
+
+def nearest_popups(df_map, nearest, targets):
+    """Teks popup marker: nama titik + titik terdekat per target (jika ada)."""
+    popups = df_map["NamaTitik"].astype(str).astype(object)
+    if nearest is None:
+        return popups
+    rows = nearest.reindex(df_map.index)
+    for target in targets:
+        dist_col, name_col = nearest_columns(target)
+        if dist_col not in rows.columns:
+            continue
+        dist = rows[dist_col]
+        line = (
+            f"<br>Terdekat ({target}): " + rows[name_col].astype(str)
+            + " (" + dist.map("{:,.2f}".format, na_action="ignore").astype(str) + " km)"
+        )
+        popups = popups.where(dist.isna(), popups + line)
+    return popups
+
+
+def nearest_summary(nearest, targets, rows=None):
+    """Ringkasan jarak terdekat per target untuk baris rows (mis. titik di peta)."""
+    data = nearest if rows is None else nearest.reindex(rows)
+    summary = []
+    for target in targets:
+        dist = data[nearest_columns(target)[0]].dropna()
+        summary.append({
+            "Kategori Target": target,
+            "Jumlah Titik": int(len(dist)),
+            "Rata-rata (km)": round(float(dist.mean()), 3) if len(dist) else None,
+            "Median (km)": round(float(dist.median()), 3) if len(dist) else None,
+            "Maks (km)": round(float(dist.max()), 3) if len(dist) else None,
+        })
+    return summary
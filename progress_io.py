@@ -0,0 +1,146 @@
+import hashlib
+import json
+import zipfile
+from datetime import time, timedelta
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+# Format simpan progress:
+# - version 1: satu file JSON {"version": 1, "data": [...records], "settings": {...}}
+# - version 2: ZIP berisi progress.json (settings) + data.parquet
+PROGRESS_MANIFEST = "progress.json"
+PROGRESS_DATA_PARQUET = "data.parquet"
+PROGRESS_DATA_JSON = "data.json"
+
+
+# ================= JSON SAFE SERIALIZER (FIX JSON dumps) =================
+def json_safe(obj):
+    """Make objects JSON-serializable (handles numpy/pandas/time/timedelta)."""
+    if isinstance(obj, (np.integer,)):
+        return int(obj)
+    if isinstance(obj, (np.floating,)):
+        return float(obj)
+    if isinstance(obj, (np.bool_,)):
+        return bool(obj)
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, time):
+        return obj.strftime("%H:%M:%S")
+    if isinstance(obj, timedelta):
+        return int(obj.total_seconds())
+    if obj is None:
+        return None
+    try:
+        # NaN / NaT
+        if isinstance(obj, float) and np.isnan(obj):
+            return None
+    except Exception:
+        pass
+    return str(obj)
+
+
+def settings_hash(settings) -> str:
+    """Hash stabil untuk dict settings (dipakai sebagai kunci cache)."""
+    raw = json.dumps(settings, default=json_safe, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# ================= SIMPAN =================
+def dump_progress_json(df, settings) -> bytes:
+    """Format lama (version 1), tetap tersedia untuk kompatibilitas."""
+    progress = {
+        "version": 1,
+        "data": df.to_dict(orient="records"),
+        "settings": settings,
+    }
+    return json.dumps(progress, default=json_safe, ensure_ascii=False).encode("utf-8")
+
+
+def _json_encode_column(series):
+    return series.map(lambda v: json.dumps(v, default=json_safe, ensure_ascii=False))
+
+
+def _to_parquet_bytes(df):
+    """Tulis df ke Parquet. Kolom object campur tipe (1, "1", 1.0) yang
+    tidak bisa jadi Arrow disimpan sebagai teks JSON per nilai agar tipe
+    aslinya tetap sama seperti format JSON lama."""
+    import pyarrow as pa
+
+    df = df.reset_index(drop=True)
+    json_columns = []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            json_columns.append(col)
+    if json_columns:
+        df = df.copy()
+        for col in json_columns:
+            df[col] = _json_encode_column(df[col])
+    df.columns = [str(c) for c in df.columns]
+
+    buffer = BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue(), json_columns
+
+
+def dump_progress_zip(df, settings) -> bytes:
+    """Format ringkas (version 2): settings JSON + data Parquet dalam ZIP.
+    Jika pyarrow tidak ada, data disimpan sebagai JSON terkompresi."""
+    manifest = {"version": 2, "settings": settings, "columns": [str(c) for c in df.columns]}
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        try:
+            data, json_columns = _to_parquet_bytes(df)
+        except ImportError:
+            manifest["data_format"] = "json"
+            records = json.dumps(df.to_dict(orient="records"), default=json_safe, ensure_ascii=False)
+            zf.writestr(PROGRESS_DATA_JSON, records.encode("utf-8"), compress_type=zipfile.ZIP_DEFLATED)
+        else:
+            manifest["data_format"] = "parquet"
+            manifest["json_columns"] = json_columns
+            # parquet sudah terkompresi, tidak perlu deflate lagi
+            zf.writestr(PROGRESS_DATA_PARQUET, data, compress_type=zipfile.ZIP_STORED)
+        zf.writestr(
+            PROGRESS_MANIFEST,
+            json.dumps(manifest, default=json_safe, ensure_ascii=False).encode("utf-8"),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+    return buffer.getvalue()
+
+
+# ================= MUAT =================
+def _load_progress_zip(raw):
+    with zipfile.ZipFile(BytesIO(raw)) as zf:
+        manifest = json.loads(zf.read(PROGRESS_MANIFEST).decode("utf-8"))
+        if manifest.get("data_format") == "json":
+            df = pd.DataFrame(json.loads(zf.read(PROGRESS_DATA_JSON).decode("utf-8")))
+        else:
+            df = pd.read_parquet(BytesIO(zf.read(PROGRESS_DATA_PARQUET)))
+            for col in manifest.get("json_columns", []):
+                df[col] = df[col].map(json.loads).astype(object)
+    return manifest.get("settings", {}), df
+
+
+def _load_progress_json(raw):
+    progress = json.loads(raw.decode("utf-8"))
+    # Backward compatible: old format had settings at root
+    if isinstance(progress, dict) and "settings" in progress:
+        settings = progress.get("settings", {})
+        df = pd.DataFrame(progress.get("data", []))
+    else:
+        settings = progress
+        df = pd.DataFrame(progress.get("data", [])) if isinstance(progress, dict) else pd.DataFrame()
+    return settings, df
+
+
+def load_progress(raw: bytes):
+    """Muat file progress (ZIP version 2 atau JSON version 1 / lama).
+    Return (settings, df)."""
+    if zipfile.is_zipfile(BytesIO(raw)):
+        return _load_progress_zip(raw)
+    return _load_progress_json(raw)
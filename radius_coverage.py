@@ -0,0 +1,70 @@
+import json
+
+import folium
+import numpy as np
+
+from spatial_index import EARTH_RADIUS_KM
+
+# shapely (GEOS) opsional: tanpa shapely radius tetap digambar per lingkaran
+try:
+    import shapely
+    if not hasattr(shapely, "union_all"):  # shapely < 2
+        raise ImportError
+except ImportError:
+    shapely = None
+
+
+def coverage_available():
+    return shapely is not None
+
+
+def circle_polygons(lat, lon, radius_km, segments=48):
+    """Lingkaran geodesik (radius_km di permukaan bumi) sebagai poligon
+    lon/lat, dibangun vectorized untuk semua titik sekaligus."""
+    lat1 = np.radians(np.asarray(lat, dtype=float))[:, None]
+    lon1 = np.radians(np.asarray(lon, dtype=float))[:, None]
+    bearing = np.linspace(0, 2 * np.pi, segments, endpoint=False)[None, :]
+    d = radius_km / EARTH_RADIUS_KM
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(d) + np.cos(lat1) * np.sin(d) * np.cos(bearing))
+    lon2 = lon1 + np.arctan2(
+        np.sin(bearing) * np.sin(d) * np.cos(lat1),
+        np.cos(d) - np.sin(lat1) * np.sin(lat2),
+    )
+    return shapely.polygons(np.stack([np.degrees(lon2), np.degrees(lat2)], axis=-1))
+
+
+def area_km2(geom):
+    """Luas geometri lon/lat (km²) lewat proyeksi silinder equal-area
+    (luas pada bola tetap, tanpa pyproj)."""
+    projected = shapely.transform(geom, lambda xy: np.column_stack([
+        EARTH_RADIUS_KM * np.radians(xy[:, 0]),
+        EARTH_RADIUS_KM * np.sin(np.radians(xy[:, 1])),
+    ]))
+    return float(shapely.area(projected))
+
+
+def coverage_union(lat, lon, radius_km, simplify_ratio=0.02):
+    """Gabungan (union) semua lingkaran radius_km. Return (poligon
+    tersederhanakan untuk peta, luas cakupan km² dari union asli)."""
+    if len(lat) == 0 or radius_km <= 0:
+        return None, 0.0
+    union = shapely.union_all(circle_polygons(lat, lon, radius_km))
+    # toleransi ~2% radius (derajat): tepi tetap halus, jumlah vertex jauh berkurang
+    tolerance = radius_km * simplify_ratio / (np.pi * EARTH_RADIUS_KM / 180.0)
+    return shapely.simplify(union, tolerance, preserve_topology=True), area_km2(union)
+
+
+def coverage_layer(geom, color, name, fill_opacity=0.2):
+    """Satu FeatureGroup berisi satu poligon cakupan (bukan satu Circle per titik)."""
+    group = folium.FeatureGroup(name=name)
+    if geom is None or geom.is_empty:
+        return group
+    # 6 desimal (~0.1 m) cukup untuk tampilan; payload JSON jauh lebih kecil
+    geom = shapely.transform(geom, lambda xy: np.round(xy, 6))
+    folium.GeoJson(
+        json.loads(shapely.to_geojson(geom)),
+        style_function=lambda _: {
+            "color": color, "fillColor": color, "weight": 2, "fillOpacity": fill_opacity,
+        },
+    ).add_to(group)
+    return group
@@ -0,0 +1,201 @@
+import threading
+
+import numpy as np
+
+# Radius bumi rata-rata (km) & panjang 1 derajat lintang
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180.0
+
+
+class GeoGridIndex:
+    """Index grid lat/lon untuk query "titik mana saja dalam X km".
+
+    Titik diurutkan per sel grid sekali saja; grid untuk ukuran sel tertentu
+    disimpan sehingga query berikutnya (radius lain) tidak perlu sort ulang.
+    Query dikerjakan sepenuhnya vectorized: kandidat diambil dari sel
+    tetangga lalu disaring dengan jarak haversine.
+    Catatan: tidak menangani wrap di garis bujur 180°.
+    """
+
+    # batas jumlah pasangan kandidat per batch (menjaga memori tetap kecil)
+    max_pairs = 4_000_000
+
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self._lat_rad = np.radians(self.lat)
+        self._lon_rad = np.radians(self.lon)
+        self._cos_lat = np.cos(self._lat_rad)
+        self._grids = {}
+        self._grids_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _grid(self, cell_deg):
+        grid = self._grids.get(cell_deg)
+        if grid is not None:
+            return grid
+        with self._grids_lock:
+            grid = self._grids.get(cell_deg)
+            if grid is not None:
+                return grid
+            width = int(np.ceil(360.0 / cell_deg)) + 1
+            iy = np.floor((self.lat + 90.0) / cell_deg).astype(np.int64)
+            ix = np.floor((self.lon + 180.0) / cell_deg).astype(np.int64)
+            keys = iy * width + ix
+            order = np.argsort(keys, kind="stable")
+            grid = (width, order, keys[order])
+            self._grids[cell_deg] = grid
+        return grid
+
+    def _neighbour_ranges(self, q_lat, q_lon, radius_km):
+        """Rentang (lo, hi) pada grid terurut yang mencakup semua titik dalam
+        radius_km dari tiap query; satu rentang per baris grid tetangga.
+        Return (order, lo, hi, h_max)."""
+        # ukuran sel ~ radius/2..radius/4 (pangkat 2 agar grid bisa dipakai ulang)
+        r_deg = radius_km / KM_PER_DEG
+        cell_deg = float(2.0 ** np.floor(np.log2(max(r_deg / 2.0, 1e-3))))
+        cell_deg = min(cell_deg, 45.0)
+        # bandingkan suku haversine langsung (tanpa arcsin/sqrt per pasangan)
+        h_max = np.sin(min(radius_km / EARTH_RADIUS_KM, np.pi) / 2.0) ** 2
+        width, order, keys = self._grid(cell_deg)
+
+        lat_max = min(89.0, float(np.max(np.abs(q_lat))) + r_deg)
+        ky = int(np.ceil(r_deg / cell_deg))
+        kx = int(np.ceil(r_deg / np.cos(np.radians(lat_max)) / cell_deg))
+
+        q_iy = np.floor((q_lat + 90.0) / cell_deg).astype(np.int64)
+        q_ix = np.floor((q_lon + 180.0) / cell_deg).astype(np.int64)
+
+        # query diurutkan per sel: searchsorted jauh lebih cepat untuk needle terurut
+        by_cell = np.argsort(q_iy * width + q_ix, kind="stable")
+        q_iy, q_ix = q_iy[by_cell], q_ix[by_cell]
+        # setiap baris grid tetangga = satu rentang kunci yang kontinu
+        sorted_lo = np.empty((2 * ky + 1, len(q_iy)), dtype=np.int64)
+        sorted_hi = np.empty_like(sorted_lo)
+        for j, dy in enumerate(range(-ky, ky + 1)):
+            row = (q_iy + dy) * width
+            sorted_lo[j] = np.searchsorted(keys, row + np.maximum(q_ix - kx, 0), side="left")
+            sorted_hi[j] = np.maximum(
+                np.searchsorted(keys, row + np.minimum(q_ix + kx, width - 1), side="right"), sorted_lo[j]
+            )
+        lo = np.empty((len(q_iy), 2 * ky + 1), dtype=np.int64)
+        hi = np.empty_like(lo)
+        lo[by_cell] = sorted_lo.T
+        hi[by_cell] = sorted_hi.T
+        return order, lo, hi, h_max
+
+    def _batches(self, lo, hi):
+        """Potong query menjadi batch dengan total kandidat <= max_pairs."""
+        span = (hi - lo).sum(axis=1)
+        start = 0
+        while start < len(span):
+            cum = np.cumsum(span[start:])
+            stop = start + max(1, int(np.searchsorted(cum, self.max_pairs, side="right")))
+            yield start, stop
+            start = stop
+
+    def _pair_h(self, q_lat_rad, q_lon_rad, q_cos_lat, q, pos):
+        return (
+            np.sin((self._lat_rad[pos] - q_lat_rad[q]) / 2.0) ** 2
+            + q_cos_lat[q] * self._cos_lat[pos]
+            * np.sin((self._lon_rad[pos] - q_lon_rad[q]) / 2.0) ** 2
+        )
+
+    def query_radius(self, lat, lon, radius_km, exclude=None, return_pairs=True):
+        """Cari semua titik index dalam radius_km dari tiap titik query.
+
+        exclude: posisi (di index) yang tidak dihitung untuk tiap query,
+        mis. titik target itu sendiri; -1 berarti tidak ada.
+        Return (counts, pair_query, pair_point) -- pasangan terurut per query;
+        jika return_pairs=False kedua array pasangan dikembalikan kosong.
+        """
+        q_lat = np.asarray(lat, dtype=float)
+        q_lon = np.asarray(lon, dtype=float)
+        n_query = len(q_lat)
+        empty = np.empty(0, dtype=np.int64)
+        if n_query == 0 or len(self) == 0 or radius_km < 0:
+            return np.zeros(n_query, dtype=np.int64), empty, empty
+        if exclude is None:
+            exclude = np.full(n_query, -1, dtype=np.int64)
+        exclude = np.asarray(exclude, dtype=np.int64)
+
+        q_lat_rad, q_lon_rad = np.radians(q_lat), np.radians(q_lon)
+        q_cos_lat = np.cos(q_lat_rad)
+        order, lo, hi, h_max = self._neighbour_ranges(q_lat, q_lon, radius_km)
+
+        counts = np.zeros(n_query, dtype=np.int64)
+        pair_query, pair_point = [], []
+        for start, stop in self._batches(lo, hi):
+            q, pos = self._candidates(order, np.arange(start, stop), lo[start:stop], hi[start:stop])
+            h = self._pair_h(q_lat_rad, q_lon_rad, q_cos_lat, q, pos)
+            keep = (h <= h_max) & (pos != exclude[q])
+            q, pos = q[keep], pos[keep]
+            counts += np.bincount(q, minlength=n_query)
+            if return_pairs:
+                pair_query.append(q)
+                pair_point.append(pos)
+
+        if not return_pairs:
+            return counts, empty, empty
+        pair_query = np.concatenate(pair_query)
+        pair_point = np.concatenate(pair_point)
+        sort = np.argsort(pair_query, kind="stable")
+        return counts, pair_query[sort], pair_point[sort]
+
+    def query_nearest(self, lat, lon, exclude=None, start_km=0.05):
+        """Titik index terdekat dari tiap titik query (exclude seperti
+        query_radius). Radius pencarian dimulai dari start_km lalu
+        digandakan hanya untuk query yang belum menemukan titik; titik
+        pertama yang ditemukan dalam radius r pasti terdekat dalam r, jadi
+        hasilnya eksak tanpa membandingkan semua pasangan (bukan O(n x m)).
+        Return (jarak_km, posisi); NaN / -1 jika tidak ada titik."""
+        q_lat = np.asarray(lat, dtype=float)
+        q_lon = np.asarray(lon, dtype=float)
+        n_query = len(q_lat)
+        best_h = np.full(n_query, np.inf)
+        nearest = np.full(n_query, -1, dtype=np.int64)
+        exclude = np.full(n_query, -1, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+        q_lat_rad, q_lon_rad = np.radians(q_lat), np.radians(q_lon)
+        q_cos_lat = np.cos(q_lat_rad)
+
+        pending = np.arange(n_query) if len(self) else np.empty(0, dtype=np.int64)
+        max_km = np.pi * EARTH_RADIUS_KM
+        radius_km = min(float(start_km), max_km)
+        while len(pending):
+            order, lo, hi, h_max = self._neighbour_ranges(q_lat[pending], q_lon[pending], radius_km)
+            for start, stop in self._batches(lo, hi):
+                q, pos = self._candidates(order, np.arange(start, stop), lo[start:stop], hi[start:stop])
+                q = pending[q]
+                h = self._pair_h(q_lat_rad, q_lon_rad, q_cos_lat, q, pos)
+                keep = (h <= h_max) & (pos != exclude[q])
+                q, pos, h = q[keep], pos[keep], h[keep]
+                if not len(q):
+                    continue
+                # q terurut per query: minimum per kelompok, seri -> kandidat pertama
+                starts = np.flatnonzero(np.append(True, q[1:] != q[:-1]))
+                group_min = np.repeat(np.minimum.reduceat(h, starts), np.diff(np.append(starts, len(q))))
+                first = np.flatnonzero(h == group_min)
+                first = first[np.append(True, q[first][1:] != q[first][:-1])]
+                best_h[q[first]] = h[first]
+                nearest[q[first]] = pos[first]
+            pending = pending[nearest[pending] < 0]
+            if radius_km >= max_km:
+                break
+            radius_km = min(radius_km * 2.0, max_km)
+
+        found = nearest >= 0
+        dist = np.full(n_query, np.nan)
+        dist[found] = 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(best_h[found], 0.0, 1.0)))
+        return dist, nearest
+
+    @staticmethod
+    def _candidates(order, queries, lo, hi):
+        """Ekspansi rentang (lo, hi) menjadi pasangan (query, posisi titik)."""
+        sizes = (hi - lo).ravel()
+        total = int(sizes.sum())
+        q = np.repeat(np.repeat(queries, lo.shape[1]), sizes)
+        offsets = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        sorted_pos = np.arange(total) - offsets + np.repeat(lo.ravel(), sizes)
+        return q, order[sorted_pos]
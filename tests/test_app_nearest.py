@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit_folium")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ingest_cache  # noqa: E402
+
+
+def _app(tmp_path, monkeypatch, **state):
+    monkeypatch.setattr(ingest_cache, "CACHE_DIR", tmp_path)
+    rng = np.random.default_rng(0)
+    n = 200
+    ingest_cache.spill_frame("progress-nearest-test", pd.DataFrame({
+        "Nama": [f"KCP {i}" for i in range(n)],
+        "Lat": rng.uniform(-8, -6, n).round(5),
+        "Lon": rng.uniform(106, 112, n).round(5),
+        "Warna": rng.choice(["red", "blue"], n),
+        "Propinsi": rng.choice(["DKI", "Jabar", "Jatim"], n),
+    }))
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=120)
+    at.session_state["saved_df_key"] = "progress-nearest-test"
+    at.session_state["col_lat_saved"] = "Lat"
+    at.session_state["col_lon_saved"] = "Lon"
+    at.session_state["name_column_saved"] = "Nama"
+    at.session_state["warna_column_saved"] = "Warna"
+    for key, value in state.items():
+        at.session_state[key] = value
+    return at
+
+
+def _category_select(at):
+    return next(s for s in at.sidebar.selectbox if s.label == "Kolom Kategori")
+
+
+def test_pick_category_without_saved_targets(tmp_path, monkeypatch):
+    at = _app(tmp_path, monkeypatch).run()
+    assert not at.exception
+    _category_select(at).set_value("Propinsi")
+    at.run()
+    assert not at.exception
+    targets = next(m for m in at.sidebar.multiselect if m.label == "Kategori Target")
+    assert targets.value == []
+
+
+def test_switch_category_drops_targets_not_in_options(tmp_path, monkeypatch):
+    at = _app(tmp_path, monkeypatch, nearest_column="(Warna Marker)", nearest_targets=["red"]).run()
+    assert not at.exception
+    _category_select(at).set_value("Propinsi")
+    at.run()
+    assert not at.exception
+    assert at.session_state["nearest_targets"] == []
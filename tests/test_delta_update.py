@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from delta_update import apply_delta, update_prepared  # noqa: E402
+from filter_index import FilterIndex  # noqa: E402
+from ingest_cache import compact_dtypes  # noqa: E402
+from map_core import normalize_display_values, sanitize_coordinates  # noqa: E402
+
+
+def _base(lat, lon):
+    n = len(lat)
+    return compact_dtypes(pd.DataFrame({
+        "ID": [f"K{i}" for i in range(n)],
+        "Lat": lat,
+        "Lon": lon,
+        "Prov": np.resize(["DKI", "Jabar", "Jatim"], n),
+    }))
+
+
+def _check(base, delta):
+    prepared = sanitize_coordinates(base, "Lat", "Lon", "ID")
+    df_new, info = apply_delta(base, delta, "ID")
+    patched, patched_mask = update_prepared(prepared, df_new, info, "Lat", "Lon", "ID")
+    fresh, fresh_mask = sanitize_coordinates(df_new, "Lat", "Lon", "ID")
+    pd.testing.assert_frame_equal(patched, fresh, check_exact=True)
+    pd.testing.assert_series_equal(patched_mask, fresh_mask)
+
+
+rng = np.random.default_rng(0)
+N = 2000
+FULL_LAT = rng.uniform(-8, -6, N)
+FULL_LON = rng.uniform(106, 112, N)
+
+
+@pytest.mark.parametrize("lat, lon", [
+    (FULL_LAT, FULL_LON),                                             # float presisi penuh
+    (FULL_LAT.round(5), FULL_LON.round(5)),
+    (rng.integers(-8, -6, N), rng.integers(106, 112, N)),            # integer
+    ([f"{v:.5f}".replace(".", ",") for v in FULL_LAT], [f"{v:.5f}" for v in FULL_LON]),  # teks
+])
+def test_update_prepared_matches_full_recompute(lat, lon):
+    base = _base(lat, lon)
+    updates = base.iloc[::37][["ID", "Lat", "Lon"]].copy()
+    updates["Lat"] = updates["Lat"].iloc[::-1].to_numpy()
+    inserts = base.iloc[:5][["ID", "Lat", "Lon"]].assign(ID=[f"Baru{i}" for i in range(5)])
+    deletes = pd.DataFrame({"ID": ["K3", "K10"], "Aksi": ["hapus", "hapus"]})
+    _check(base, pd.concat([updates, inserts, deletes], ignore_index=True))
+
+
+def test_update_prepared_when_delta_turns_float_column_into_text():
+    base = _base(FULL_LAT, FULL_LON)
+    delta = pd.DataFrame({"ID": ["K1", "K2", "Baru"], "Lat": ["-6,5", "rusak", "-7,25"], "Lon": [107.0, 108.0, 109.0]})
+    _check(base, delta)
+
+
+def test_update_prepared_int_coordinates_stay_int():
+    base = _base(rng.integers(-8, -6, N), rng.integers(106, 112, N))
+    _check(base, pd.DataFrame({"ID": ["K1", "Baru"], "Lat": [-7, -6], "Lon": [110, 111]}))
+
+
+def test_updated_filter_index_matches_fresh_index():
+    base = _base(FULL_LAT.round(5), FULL_LON.round(5))
+    base["Kelas"] = np.resize(np.array([1, 1.0, "1", "2.5", None], dtype=object), N)
+    base = compact_dtypes(base)
+    prepared = sanitize_coordinates(base, "Lat", "Lon", "ID")
+    index = FilterIndex(len(base), normalize_display_values)
+    for col in ["Prov", "Kelas", "NamaTitik"]:
+        index.options(prepared[0], col)
+
+    delta = pd.DataFrame({
+        "ID": ["K1", "K2", "K5", "Baru1", "Baru2", "K7"],
+        "Prov": ["Bali", None, "dki", "Bali", "NTB", None],
+        "Kelas": [2.5, "3", None, 1.0, "", None],
+        "Aksi": ["", "", "", "", "", "hapus"],
+    })
+    df_new, info = apply_delta(base, delta, "ID")
+    patched_df, _ = update_prepared(prepared, df_new, info, "Lat", "Lon", "ID")
+    patched = index.updated(patched_df, info["kept_old"], info["changed"])
+    fresh = FilterIndex(len(patched_df), normalize_display_values)
+
+    mask = np.random.default_rng(1).random(len(patched_df)) < 0.5
+    for col in ["Prov", "Kelas", "NamaTitik"]:
+        options = fresh.options(patched_df, col)
+        assert patched.options(patched_df, col) == options
+        assert patched.options(patched_df, col, mask) == fresh.options(patched_df, col, mask)
+        for chosen in (options[:1], options[1:4], ["tidak ada"]):
+            assert np.array_equal(patched.rows_for(patched_df, col, chosen), fresh.rows_for(patched_df, col, chosen))
@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from filter_index import FilterIndex  # noqa: E402
+from map_core import normalize_display, normalize_display_values  # noqa: E402
+
+
+def _build_display_map(series):
+    """Versi lama (sebelum FilterIndex), sebagai acuan."""
+    display_map = {}
+    for v in pd.unique(series.dropna()):
+        key = normalize_display(v)
+        if key is None:
+            continue
+        display_map.setdefault(key, []).append(v)
+    return display_map
+
+
+def _frame(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Propinsi": rng.choice(np.array(["DKI", "dki", "Jabar", "JABAR", "Jatim", None], dtype=object), n),
+        "Kota": rng.choice(np.array([1, 1.0, "1", "2.50", 2.5, "Bogor", "bogor ", "", None], dtype=object), n),
+        "Kanwil": rng.integers(1, 9, n),
+        "Skor": np.where(rng.random(n) < 0.1, np.nan, rng.integers(0, 5, n) / 2),
+    })
+
+
+def _pick(options, rng):
+    if not options:
+        return []
+    size = int(rng.integers(1, len(options) + 1))
+    return [options[i] for i in sorted(rng.choice(len(options), size=size, replace=False))]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cascading_filters_match_display_map_and_isin(seed):
+    df = _frame(seed=seed)
+    rng = np.random.default_rng(seed)
+    index = FilterIndex(len(df), normalize_display_values)
+    row_mask = index.all_rows()
+    filtered_df = df
+
+    for col in ["Propinsi", "Kota", "Kanwil", "Skor"]:
+        disp_map = _build_display_map(filtered_df[col])
+        expected = sorted(disp_map.keys(), key=str.lower)
+        assert index.options(df, col, row_mask) == expected
+
+        selected = _pick(expected, rng)
+        originals = [v for d in selected for v in disp_map.get(d, [])]
+        filtered_df = filtered_df[filtered_df[col].isin(originals)]
+        row_mask &= index.rows_for(df, col, selected)
+        assert np.array_equal(np.flatnonzero(row_mask), df.index.get_indexer(filtered_df.index))
+
+
+def test_options_without_mask_cover_whole_column():
+    df = _frame()
+    index = FilterIndex(len(df), normalize_display_values)
+    for col in df.columns:
+        assert index.options(df, col) == sorted(_build_display_map(df[col]).keys(), key=str.lower)
@@ -0,0 +1,72 @@
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from map_core import legend_html, legend_stats, normalize_display  # noqa: E402
+
+
+def _counter_legend(values, colors):
+    """Loop Counter lama (sebelum legend_stats), sebagai acuan."""
+    color_counter = defaultdict(Counter)
+    for v, c in zip(values, colors):
+        if v is None or pd.isna(v):
+            continue
+        label = normalize_display(v)
+        if label is None or label == "":
+            continue
+        color_counter[label][c] += 1
+    return {label: (cnt.most_common(1)[0][0], sum(cnt.values())) for label, cnt in color_counter.items()}
+
+
+def _values(n, n_labels, rng):
+    pool = np.array([1, 1.0, "1", "2.50", 2.5, "", " ", None, np.nan, "Bogor", "bogor"]
+                    + [f"Kota {i}" for i in range(n_labels)], dtype=object)
+    return pd.Series(rng.choice(pool, n), dtype=object)
+
+
+@pytest.mark.parametrize("n, n_labels, n_colors", [
+    (5000, 10, 4),      # tabel label x warna padat (bincount)
+    (300, 400, 19),     # label jarang (np.unique)
+    (50, 3, 1),
+    (1, 0, 1),
+])
+def test_legend_stats_matches_counter_loop(n, n_labels, n_colors):
+    rng = np.random.default_rng(n)
+    values = _values(n, n_labels, rng)
+    palette = ["red", "blue", "green", "orange", "gray", "black", "white", "pink", "beige", "purple",
+               "darkred", "lightred", "darkblue", "darkgreen", "cadetblue", "darkpurple",
+               "lightblue", "lightgreen", "lightgray"]
+    colors = pd.Series(rng.choice(palette[:n_colors], n))
+    expected = _counter_legend(values, colors)
+
+    stats = legend_stats(values, colors)
+    got = {label: (color, count) for label, color, count in
+           zip(stats["label"], stats["color"], stats["count"].tolist())}
+    assert got == expected
+    # urutan baris = kemunculan pertama label (urutan dict Counter)
+    assert list(got) == list(expected)
+
+
+def test_legend_stats_tie_keeps_first_seen_color():
+    values = pd.Series(["A", "A", "A", "A", "B", "B"])
+    colors = pd.Series(["green", "red", "red", "green", "blue", "gray"])
+    assert _counter_legend(values, colors) == {"A": ("green", 4), "B": ("blue", 2)}
+    stats = legend_stats(values, colors)
+    assert stats["color"].tolist() == ["green", "blue"]
+
+
+def test_legend_alpha_order_matches_sorted_labels():
+    rng = np.random.default_rng(1)
+    df_map = pd.DataFrame({"Kota": _values(2000, 30, rng)})
+    colors = pd.Series(rng.choice(["red", "blue"], len(df_map)), index=df_map.index)
+    labels = sorted(_counter_legend(df_map["Kota"], colors), key=lambda s: str(s).lower())
+
+    html = legend_html(df_map, colors, "Kota", sort="alpha", show_counts=False, max_items=len(labels))
+    positions = [html.index(f"></div>{label}</div>") for label in labels]
+    assert positions == sorted(positions)
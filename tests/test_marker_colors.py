@@ -0,0 +1,82 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from map_core import (  # noqa: E402
+    available_folium_colors, icon_colors, normalize_display, normalize_folium_color,
+    resolve_marker_colors,
+)
+
+
+def _resolve_marker_color(row, warna_column, custom_colors):
+    """Aturan per-baris lama (sebelum resolve_marker_colors), sebagai acuan."""
+    warna = "blue"
+    try:
+        ref_value = row.get(warna_column) if warna_column else None
+    except Exception:
+        ref_value = None
+
+    disp_key = None
+    if ref_value is not None and not pd.isna(ref_value):
+        disp_key = normalize_display(ref_value)
+
+    if disp_key and disp_key in custom_colors:
+        return normalize_folium_color(custom_colors[disp_key])
+
+    if "Warna_Akhir" in row.index and pd.notna(row.get("Warna_Akhir")):
+        warna_akhir = str(row.get("Warna_Akhir")).strip()
+        if warna_akhir:
+            return normalize_folium_color(warna_akhir)
+
+    if "Warna" in row.index and pd.notna(row.get("Warna")):
+        warna_col = str(row.get("Warna")).strip()
+        if warna_col:
+            return normalize_folium_color(warna_col)
+
+    return normalize_folium_color(warna)
+
+
+def _frame(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Nama": [f"KCP {i}" for i in range(n)],
+        "Kelas": rng.choice(np.array([1, 1.0, "1", "2.50", 2.5, 3, "", " 3 ", None], dtype=object), n),
+        "Warna": rng.choice(np.array(["Red", " green ", "darkklue", "", None, "ungu", "PURPEL"], dtype=object), n),
+        "Warna_Akhir": rng.choice(np.array([None, None, "orange", " ", "Lightgren", np.nan], dtype=object), n),
+    })
+
+
+CUSTOM = {"1": "Green", "2.5": "purpel", "3": " BLACK "}
+
+
+@pytest.mark.parametrize("columns, warna_column, custom", [
+    (None, "Kelas", CUSTOM),
+    (None, "Kelas", {}),
+    (None, None, CUSTOM),
+    (["Nama", "Kelas", "Warna"], "Kelas", CUSTOM),          # tanpa Warna_Akhir
+    (["Nama", "Kelas"], "Kelas", {"1": "red"}),            # tanpa kolom warna sama sekali
+    (["Nama", "Warna"], "Kelas", CUSTOM),                  # warna_column tidak ada di data
+])
+def test_resolve_marker_colors_matches_per_row_rule(columns, warna_column, custom):
+    df = _frame()
+    if columns is not None:
+        df = df[columns]
+    expected = [_resolve_marker_color(row, warna_column, custom) for _, row in df.iterrows()]
+    colors = resolve_marker_colors(df, warna_column, custom)
+    assert colors.tolist() == expected
+    assert colors.index.equals(df.index)
+
+    icons = [normalize_folium_color(c) if normalize_folium_color(c) in available_folium_colors else "blue"
+             for c in expected]
+    assert icon_colors(colors).tolist() == icons
+
+
+def test_resolve_marker_colors_numeric_warna_column():
+    df = pd.DataFrame({"Kelas": [1.0, 2.0, np.nan, 2.5, 1.0], "Warna": ["red", None, "blue", "", "gray"]})
+    expected = [_resolve_marker_color(row, "Kelas", CUSTOM) for _, row in df.iterrows()]
+    assert resolve_marker_colors(df, "Kelas", CUSTOM).tolist() == expected
@@ -0,0 +1,58 @@
+import sys
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from map_core import display_keys, normalize_display, normalize_display_values  # noqa: E402
+
+rng = np.random.default_rng(0)
+
+CASES = {
+    "int_vs_float_object": pd.Series([1, 1.0, "1", "1.0", " 1 ", 2, 2.5, "2.50"], dtype=object),
+    "float64": pd.Series([1.0, 2.5, -0.0, 1e20, 1e-7, 123456.789, np.nan, np.inf, -np.inf]),
+    "float_random": pd.Series(rng.uniform(-1000, 1000, 500)),
+    "float_rounded": pd.Series(rng.uniform(-8, -6, 500).round(5)),
+    "float32": pd.Series([1.0, 2.5, 0.1, np.nan], dtype=np.float32),
+    "int64": pd.Series([0, 1, -5, 2**53 + 1, 10**18]),
+    "uint8": pd.Series([0, 7, 255], dtype=np.uint8),
+    "nullable_int": pd.Series([1, None, 3], dtype="Int64"),
+    "nullable_float": pd.Series([1.0, None, 2.5], dtype="Float64"),
+    "text": pd.Series(["DKI", " Jabar ", "", "  ", "1e3", "inf", "nan", "-0", "0x10", "1_000", "١٢"]),
+    "text_arrow": pd.Series(["a", "1.50", None, " 7 "], dtype="string"),
+    "category": pd.Series(["b", "1", "1.0", None, "b"], dtype="category"),
+    "category_numeric": pd.Series([1.0, 2.5, None, 1.0], dtype="category"),
+    "bool": pd.Series([True, False, True]),
+    "bool_object": pd.Series([True, 1, "x", None], dtype=object),
+    "dates": pd.Series(pd.to_datetime(["2024-01-01", None, "2024-03-05"])),
+    "date_object": pd.Series([date(2024, 1, 1), "2024-01-01", 3], dtype=object),
+    "numpy_scalars": pd.Series([np.int32(4), np.float32(0.5), np.float64(4.0)], dtype=object),
+    "huge_int_object": pd.Series([10**30, 1], dtype=object),
+    "empty": pd.Series([], dtype=object),
+}
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_normalize_display_values_matches_per_value(name):
+    series = CASES[name]
+    uniques = pd.unique(series)
+    expected = [normalize_display(v) for v in uniques]
+    assert list(normalize_display_values(uniques)) == expected
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_display_keys_matches_map(name):
+    series = CASES[name]
+    expected = [normalize_display(v) for v in series]
+    # display_keys memberi NaN (bukan None) untuk baris kosong
+    got = display_keys(series).tolist()
+    assert [None if k is None or (isinstance(k, float) and np.isnan(k)) else k for k in got] == expected
+
+
+def test_one_and_one_point_zero_share_a_key():
+    keys = normalize_display_values(pd.unique(CASES["int_vs_float_object"]))
+    assert set(keys) == {"1", "2", "2.5"}
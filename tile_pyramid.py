@@ -0,0 +1,276 @@
+import json
+import os
+import shutil
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import folium
+import numpy as np
+import pandas as pd
+
+from map_core import FOLIUM_COLOR_HEX
+from viewport_cluster import _mercator
+
+# Pyramid tile raster (PNG) hasil pre-render offline. Disimpan di folder
+# static Streamlit (server.enableStaticServing) agar bisa dipakai sebagai
+# folium.TileLayer; biaya di browser tidak lagi tergantung jumlah titik.
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+TILE_DIR = Path(os.environ.get("MAP_TILE_DIR", STATIC_DIR / "tiles"))
+TILE_SIZE = 256
+TILE_META = "tiles.json"
+NO_TILES = "(Tidak ada)"
+
+# PNG berpalet (1 byte per piksel): 0 = transparan, 1 = garis tepi titik
+# (abu gelap semi transparan, agar titik berdempetan tetap terbaca), 2.. = warna marker
+_TRANSPARENT = [0, 0, 0, 0]
+_OUTLINE = [40, 40, 40, 180]
+_FIRST_COLOR = 2
+# di atas jumlah titik ini satu tile digambar lewat filter maksimum per piksel
+_STAMP_MAX_POINTS = 600
+# level 3: ~3x lebih cepat dari default (6), file hanya sedikit lebih besar
+_ZLIB_LEVEL = 3
+
+
+def _png(pixels, palette):
+    """PNG berpalet 8-bit dari array indeks (h, w) & palette RGBA (n, 4);
+    cukup zlib, tanpa Pillow. Transparansi lewat chunk tRNS."""
+    h, w = pixels.shape
+    raw = np.zeros((h, w + 1), dtype=np.uint8)  # byte pertama tiap baris: filter 0
+    raw[:, 1:] = pixels
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 3, 0, 0, 0))
+        + chunk(b"PLTE", palette[:, :3].tobytes())
+        + chunk(b"tRNS", palette[:, 3].tobytes())
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), _ZLIB_LEVEL))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _rgba(color):
+    """Nama warna folium -> RGBA (warna marker yang sama dengan ikon peta)."""
+    hex_color = FOLIUM_COLOR_HEX.get(str(color), FOLIUM_COLOR_HEX["blue"]).lstrip("#")
+    return [int(hex_color[i:i + 2], 16) for i in (0, 2, 4)] + [255]
+
+
+def point_radius(zoom):
+    """Jari-jari titik (piksel) per zoom: kecil saat jauh, membesar saat dekat."""
+    return float(np.clip(1.5 + zoom * 0.25, 2.0, 5.0))
+
+
+def _disc_max(order, radius):
+    """Maksimum order dalam lingkaran berjari-jari radius di sekitar tiap
+    piksel (-1 = tidak tertutup titik mana pun). Dipecah per baris: maksimum
+    horizontal selebar w dibangun bertahap, lalu digabung per offset baris,
+    sehingga biaya tidak tergantung jumlah titik di tile."""
+    reach = int(radius)
+    levels = [order]
+    for _ in range(reach):
+        prev = levels[-1]
+        cur = prev.copy()
+        np.maximum(cur[:, 1:], prev[:, :-1], out=cur[:, 1:])
+        np.maximum(cur[:, :-1], prev[:, 1:], out=cur[:, :-1])
+        levels.append(cur)
+    out = np.full_like(order, -1)
+    n = len(order)
+    for dy in range(-reach, reach + 1):
+        src = levels[int(np.sqrt(radius * radius - dy * dy))]
+        if dy >= 0:
+            np.maximum(out[:n - dy], src[dy:], out=out[:n - dy])
+        else:
+            np.maximum(out[-dy:], src[:n + dy], out=out[-dy:])
+    return out
+
+
+def _disc(radius):
+    r = int(np.ceil(radius))
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    inside = dx * dx + dy * dy <= radius * radius
+    return dx[inside], dy[inside]
+
+
+def _stamp(img, lx, ly, values, radius):
+    """Cap lingkaran per titik (cepat untuk tile yang berisi sedikit titik)."""
+    ox, oy = _disc(radius)
+    x = lx[:, None] + ox[None, :]
+    y = ly[:, None] + oy[None, :]
+    inside = (x >= 0) & (x < TILE_SIZE) & (y >= 0) & (y < TILE_SIZE)
+    img[y[inside], x[inside]] = np.broadcast_to(values[:, None], x.shape)[inside]
+
+
+def _draw_tile(lx, ly, values, radius):
+    """Gambar titik pada satu tile: garis tepi semua titik, lalu isi; titik
+    yang belakangan berada di atas. lx/ly boleh sedikit di luar tile (titik
+    tetangga yang lingkarannya masuk tile ini)."""
+    img = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+    if len(lx) <= _STAMP_MAX_POINTS:
+        _stamp(img, lx, ly, np.ones(len(lx), dtype=np.uint8), radius + 1.0)
+        _stamp(img, lx, ly, values, radius)
+        return img
+    # tile padat: per piksel cukup titik teratas (order terbesar) yang menutupinya
+    pad = int(np.ceil(radius)) + 1
+    size = TILE_SIZE + 2 * pad
+    order = np.full((size, size), -1, dtype=np.int32)
+    order[ly + pad, lx + pad] = np.arange(len(lx), dtype=np.int32)  # satu titik per piksel
+    core = (slice(pad, pad + TILE_SIZE), slice(pad, pad + TILE_SIZE))
+    outline = _disc_max(order, radius + 1.0)[core]
+    fill = _disc_max(order, radius)[core]
+    img[outline >= 0] = 1
+    covered = fill >= 0
+    img[covered] = values[fill[covered]]
+    return img
+
+
+def _write_tile(job):
+    out_dir, zoom, tx, ty, lx, ly, values, palette, radius = job
+    path = Path(out_dir) / str(zoom) / str(tx) / f"{ty}.png"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(_png(_draw_tile(lx, ly, values, radius), palette))
+    return 1
+
+
+def _zoom_tiles(x, y, values, palette, zoom, out_dir):
+    """Job per tile berisi titik untuk satu zoom. Satu titik per piksel
+    (yang digambar terakhir); titik di dekat tepi ikut ke tile tetangga
+    agar lingkarannya tidak terpotong."""
+    if not len(x):
+        return
+    world = TILE_SIZE * 2 ** zoom
+    ix = np.minimum((x * world).astype(np.int64), world - 1)
+    iy = np.minimum((y * world).astype(np.int64), world - 1)
+    _, last = np.unique((ix * world + iy)[::-1], return_index=True)
+    keep = np.sort(len(ix) - 1 - last)
+    ix, iy, values = ix[keep], iy[keep], values[keep]
+    order = np.arange(len(ix))
+
+    radius = point_radius(zoom)
+    reach = int(np.ceil(radius)) + 1
+    n_tiles = 2 ** zoom
+    tx, ty = ix // TILE_SIZE, iy // TILE_SIZE
+    lx, ly = ix - tx * TILE_SIZE, iy - ty * TILE_SIZE
+    near = {-1: (lx < reach, ly < reach), 0: (True, True), 1: (lx >= TILE_SIZE - reach, ly >= TILE_SIZE - reach)}
+    parts = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            m = near[dx][0] & near[dy][1] & (tx + dx >= 0) & (tx + dx < n_tiles) & (ty + dy >= 0) & (ty + dy < n_tiles)
+            parts.append((tx[m] + dx, ty[m] + dy, lx[m] - dx * TILE_SIZE, ly[m] - dy * TILE_SIZE, values[m], order[m]))
+    tx, ty, lx, ly, values, order = (np.concatenate(p) for p in zip(*parts))
+
+    tile_key = tx * n_tiles + ty
+    sort = np.lexsort((order, tile_key))
+    tile_key, tx, ty, lx, ly, values = tile_key[sort], tx[sort], ty[sort], lx[sort], ly[sort], values[sort]
+    bounds = np.flatnonzero(np.diff(tile_key)) + 1
+    for start, stop in zip(np.append(0, bounds), np.append(bounds, len(tile_key))):
+        yield (out_dir, zoom, int(tx[start]), int(ty[start]),
+               lx[start:stop], ly[start:stop], values[start:stop], palette, radius)
+
+
+def _clear_pyramid(out_dir):
+    """Hapus tile lama (folder zoom & metadata) sebelum dirender ulang."""
+    if not out_dir.exists():
+        return
+    for child in out_dir.iterdir():
+        if child.is_dir() and child.name.isdigit():
+            shutil.rmtree(child)
+    (out_dir / TILE_META).unlink(missing_ok=True)
+
+
+def render_pyramid(lat, lon, colors, out_dir, min_zoom=0, max_zoom=12, workers=None):
+    """Render semua titik menjadi pyramid tile PNG {z}/{x}/{y}.png di out_dir
+    (zoom min_zoom..max_zoom; tile kosong tidak ditulis). colors = nama warna
+    folium per titik. Encode & tulis tile dikerjakan paralel (thread; zlib
+    melepas GIL). Return metadata (juga disimpan sebagai tiles.json)."""
+    out_dir = Path(out_dir)
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    codes, names = pd.factorize(np.asarray(colors, dtype=object), use_na_sentinel=False)
+    # nama warna -> indeks palet (nama tak dikenal jatuh ke warna yang sama)
+    colors_rgba, color_index = np.unique(
+        np.array([_rgba(c) for c in names] or [_rgba("blue")], dtype=np.uint8), axis=0, return_inverse=True
+    )
+    palette = np.vstack([[_TRANSPARENT, _OUTLINE], colors_rgba]).astype(np.uint8)
+    values = (color_index.ravel()[codes] + _FIRST_COLOR).astype(np.uint8)
+    x, y = _mercator(lat, lon)
+
+    _clear_pyramid(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for zoom in range(min_zoom, max_zoom + 1):
+            written += sum(pool.map(_write_tile, _zoom_tiles(x, y, values, palette, zoom, out_dir)))
+
+    meta = {
+        "format": "png",
+        "tile_size": TILE_SIZE,
+        "min_zoom": int(min_zoom),
+        "max_zoom": int(max_zoom),
+        "bounds": [[float(lat.min()), float(lon.min())], [float(lat.max()), float(lon.max())]] if len(lat) else None,
+        "points": int(len(lat)),
+        "tiles": int(written),
+        "colors": {str(c): int(n) for c, n in zip(names, np.bincount(codes, minlength=len(names)))},
+    }
+    (out_dir / TILE_META).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return meta
+
+
+# ================= Dipakai app.py =================
+def list_pyramids(root=None):
+    """Nama pyramid (sub-folder berisi tiles.json) di folder tile."""
+    root = Path(root or TILE_DIR)
+    if not root.is_dir():
+        return []
+    return sorted(p.name for p in root.iterdir() if (p / TILE_META).is_file())
+
+
+def load_meta(name, root=None):
+    path = Path(root or TILE_DIR) / name / TILE_META
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def meta_version(name, root=None):
+    """Versi pyramid (mtime & ukuran tiles.json) untuk key cache; tiles.json
+    ditulis ulang setiap kali pyramid dirender. None jika tidak ada."""
+    try:
+        stat = (Path(root or TILE_DIR) / name / TILE_META).stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def tile_url(name, base_url_path=""):
+    """URL template tile lewat static serving Streamlit (/app/static/...);
+    None jika folder tile berada di luar folder static."""
+    try:
+        relative = Path(TILE_DIR).resolve().relative_to(STATIC_DIR)
+    except ValueError:
+        return None
+    base = "/" + base_url_path.strip("/") if base_url_path.strip("/") else ""
+    return f"{base}/app/static/{relative.as_posix()}/{name}/{{z}}/{{x}}/{{y}}.png"
+
+
+def tile_layer(name, meta, url):
+    """folium.TileLayer untuk pyramid; di atas max_zoom tile diperbesar."""
+    options = {
+        "min_native_zoom": meta["min_zoom"],
+        "max_native_zoom": meta["max_zoom"],
+        "max_zoom": 19,
+    }
+    if meta.get("bounds"):
+        # tile di luar area data tidak diminta sama sekali; dilebarkan
+        # selebar titik terbesar pada zoom terendah agar tepi titik tidak terpotong
+        (south, west), (north, east) = meta["bounds"]
+        pad = (point_radius(meta["max_zoom"]) + 2) * 360.0 / (TILE_SIZE * 2 ** meta["min_zoom"])
+        options["bounds"] = [[max(south - pad, -90.0), max(west - pad, -180.0)],
+                             [min(north + pad, 90.0), min(east + pad, 180.0)]]
+    return folium.TileLayer(
+        tiles=url, attr=f"Tile offline: {name}", name=f"Tile {name}", overlay=True, control=True, **options
+    )
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+
+def _mercator(lat, lon):
+    """lat/lon -> koordinat web mercator ternormalisasi [0, 1)."""
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05112878, 85.05112878)
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0
+    s = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)
+    return np.clip(x, 0.0, 1.0 - 1e-12), np.clip(y, 0.0, 1.0 - 1e-12)
+
+
+def _bounds_mask(lat, lon, bounds):
+    south, west, north, east = bounds
+    in_lat = (lat >= south) & (lat <= north)
+    if west <= east:
+        return in_lat & (lon >= west) & (lon <= east)
+    # viewport melewati garis bujur 180
+    return in_lat & ((lon >= west) | (lon <= east))
+
+
+class ViewportClusterIndex:
+    """Index cluster hierarkis (mirip supercluster) berbasis grid mercator.
+
+    Untuk setiap zoom 0..max_zoom titik dikelompokkan per sel berukuran
+    radius_px piksel layar. Level paling detail dihitung sekali, level di
+    atasnya digabung dari level di bawahnya (sel induk = sel // 2), jadi
+    index dibangun sekali per dataset terfilter. Query hanya mengembalikan
+    cluster/titik di dalam viewport sehingga payload ke browser terbatas
+    berapapun jumlah titiknya.
+    """
+
+    def __init__(self, lat, lon, colors, max_zoom=16, radius_px=60, tile_size=256):
+        # float32 cukup untuk posisi marker (~0.1 m) & separuh memori float64
+        self.lat = np.asarray(lat, dtype=np.float32)
+        self.lon = np.asarray(lon, dtype=np.float32)
+        color_codes, palette = pd.factorize(np.asarray(colors, dtype=object), use_na_sentinel=False)
+        self.color_codes = color_codes
+        self.palette = np.asarray(palette, dtype=object)
+        self.max_zoom = max_zoom
+        self.levels = {}
+
+        x, y = _mercator(self.lat, self.lon)
+        # ukuran sel = radius_px piksel pada zoom max_zoom
+        cells_per_axis = tile_size * (2 ** max_zoom) / radius_px
+        ix = np.floor(x * cells_per_axis).astype(np.int64)
+        iy = np.floor(y * cells_per_axis).astype(np.int64)
+        n = len(x)
+        level = self._aggregate(
+            ix, iy, np.ones(n, dtype=np.int64), self.lat.astype(float), self.lon.astype(float),
+            np.arange(n, dtype=np.int64),
+            (np.arange(n, dtype=np.int64), color_codes.astype(np.int64), np.ones(n, dtype=np.int64)),
+        )
+        self.levels[max_zoom] = level
+        for z in range(max_zoom - 1, -1, -1):
+            level = self._aggregate(
+                level["ix"] // 2, level["iy"] // 2, level["count"],
+                level["sum_lat"], level["sum_lon"], level["first"], level["colors"],
+            )
+            self.levels[z] = level
+
+    @staticmethod
+    def _aggregate(ix, iy, count, sum_lat, sum_lon, first, colors):
+        """Gabungkan sel (ix, iy) yang sama. colors = (sel, kode warna, jumlah)
+        dalam bentuk sparse agar memori tetap O(n)."""
+        keys = (ix << 32) | iy
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        n = len(uniq)
+        agg_first = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(agg_first, inverse, first)
+
+        c_cell, c_code, c_count = colors
+        c_cell = inverse[c_cell]
+        n_codes = int(c_code.max()) + 1 if len(c_code) else 1
+        c_keys, c_inv = np.unique(c_cell * n_codes + c_code, return_inverse=True)
+        c_count = np.bincount(c_inv, weights=c_count).astype(np.int64)
+        c_cell, c_code = c_keys // n_codes, c_keys % n_codes
+        # warna dominan: urutkan per sel lalu jumlah (menurun), ambil yang pertama
+        order = np.lexsort((-c_count, c_cell))
+        first_of_cell = np.ones(len(order), dtype=bool)
+        first_of_cell[1:] = c_cell[order][1:] != c_cell[order][:-1]
+        dominant = np.zeros(n, dtype=np.int64)
+        dominant[c_cell[order][first_of_cell]] = c_code[order][first_of_cell]
+
+        return {
+            "ix": uniq >> 32,
+            "iy": uniq & 0xFFFFFFFF,
+            "count": np.bincount(inverse, weights=count, minlength=n).astype(np.int64),
+            "sum_lat": np.bincount(inverse, weights=sum_lat, minlength=n),
+            "sum_lon": np.bincount(inverse, weights=sum_lon, minlength=n),
+            "first": agg_first,
+            "dominant": dominant,
+            "colors": (c_cell, c_code, c_count),
+        }
+
+    def __len__(self):
+        return len(self.lat)
+
+    def query(self, bounds, zoom, max_points=500, pad=0.1):
+        """Cluster & titik di dalam viewport.
+
+        bounds: (south, west, north, east) dalam derajat.
+        Return (clusters, points): clusters = DataFrame [lat, lon, count, color]
+        untuk sel berisi >1 titik, points = posisi titik individual.
+        """
+        south, west, north, east = bounds
+        dlat, dlon = (north - south) * pad, (east - west) * pad
+        bounds = (south - dlat, west - dlon, north + dlat, east + dlon)
+        zoom = int(min(max(round(zoom), 0), self.max_zoom))
+
+        visible = np.flatnonzero(_bounds_mask(self.lat, self.lon, bounds))
+        if len(visible) <= max_points:
+            return self._clusters_frame(), visible
+
+        level = self.levels[zoom]
+        c_lat = level["sum_lat"] / level["count"]
+        c_lon = level["sum_lon"] / level["count"]
+        inside = _bounds_mask(c_lat, c_lon, bounds)
+        multi = inside & (level["count"] > 1)
+        single = inside & (level["count"] == 1)
+        clusters = self._clusters_frame(
+            c_lat[multi], c_lon[multi], level["count"][multi],
+            self.palette[level["dominant"][multi]] if len(self.palette) else [],
+        )
+        return clusters, level["first"][single]
+
+    @staticmethod
+    def _clusters_frame(lat=(), lon=(), count=(), color=()):
+        return pd.DataFrame({"lat": lat, "lon": lon, "count": count, "color": color})